@@ -4,44 +4,69 @@ Flask web application for policy Q&A chatbot.
 
 import os
 import time
+import logging
 from flask import Flask, request, jsonify, render_template, send_from_directory
 from dotenv import load_dotenv
 from src.vector_store import VectorStore
 from src.rag_pipeline import RAGPipeline
 from src.document_processor import DocumentProcessor
+from src.dedup import Deduplicator
+from src.vector_backends import normalize_filter
+from src.watcher import PolicyWatcher, ReadWriteLock
 
 # Load environment variables
 load_dotenv()
 
+# Background components (e.g. the policy watcher) report through logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 # Initialize Flask app
 app = Flask(__name__)
 
 # Initialize RAG components
 vector_store = None
 rag_pipeline = None
+policy_watcher = None
 initialization_done = False
 
+# Requests read the index under the read side; hot reindexing takes the write side
+index_lock = ReadWriteLock()
+
 
 def initialize_rag():
     """Initialize or load the RAG pipeline."""
-    global vector_store, rag_pipeline, initialization_done
+    global vector_store, rag_pipeline, policy_watcher, initialization_done
 
     if initialization_done:
         return
 
     print("Starting RAG initialization...")
-    vector_store = VectorStore(persist_directory="chroma_db")
+    if os.getenv("VECTOR_BACKEND", "chroma").lower() == "snapshot":
+        # Read-only snapshot written by setup.py; opening it only maps files
+        vector_store = VectorStore(persist_directory=os.getenv("VECTOR_SNAPSHOT_PATH", "index_snapshot"))
+    else:
+        vector_store = VectorStore(persist_directory="chroma_db")
 
     # Check if vector store is empty
     stats = vector_store.get_stats()
 
-    if stats['total_documents'] == 0:
+    if stats['total_documents'] == 0 and vector_store.backend_name != "snapshot":
         print("Vector store is empty. Indexing documents...")
         processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
-        documents = processor.load_documents("data/policies")
-        print(f"Loaded {len(documents)} document chunks")
-
-        vector_store.add_documents(documents)
+        # A PCA projection is fitted on a sample of the whole corpus before streaming
+        vector_store.fit_projection(processor.iter_documents("data/policies"))
+        # Chunk, embed and write in bounded batches to keep peak memory flat
+        changes = processor.load_changed_documents("data/policies", full=True, stream=True)
+        # Near-duplicates are dropped within each file as it streams past
+        documents = Deduplicator().iter_deduplicate(changes.documents)
+        count = vector_store.add_documents_stream(documents)
+        # Serving does not need the embedding worker processes
+        vector_store.embedder.close()
+        for path, error in processor.load_errors.items():
+            print(f"Error loading {path}: {error}")
+        print(f"Loaded {count} document chunks")
+
+        processor.save_manifest(changes)
         print("Documents indexed successfully")
     else:
         print(f"Vector store loaded with {stats['total_documents']} documents")
@@ -52,10 +77,23 @@ def initialize_rag():
         model=os.getenv("LLM_MODEL", "gpt-3.5-turbo"),
         temperature=float(os.getenv("LLM_TEMPERATURE", "0.1")),
         max_tokens=int(os.getenv("LLM_MAX_TOKENS", "500")),
-        top_k=int(os.getenv("RAG_TOP_K", "5"))
+        top_k=int(os.getenv("RAG_TOP_K", "5")),
+        hybrid=os.getenv("RAG_HYBRID", "true").lower() == "true",
+        index_lock=index_lock
     )
 
     print("RAG pipeline initialized")
+
+    # Optionally apply policy edits to the live index; the watcher only starts
+    # in a single-worker deployment (see src/watcher.py)
+    if os.getenv("POLICY_WATCH", "false").lower() == "true" and vector_store.backend_name != "snapshot":
+        policy_watcher = PolicyWatcher(
+            vector_store,
+            DocumentProcessor(chunk_size=1000, chunk_overlap=200),
+            index_lock
+        )
+        policy_watcher.start()
+
     initialization_done = True
 
 
@@ -77,7 +115,8 @@ def health():
     """Health check endpoint."""
     try:
         ensure_initialized()
-        stats = vector_store.get_stats()
+        with index_lock.read():
+            stats = vector_store.get_stats()
         return jsonify({
             "status": "healthy",
             "vector_store": {
@@ -100,7 +139,8 @@ def chat():
 
     Expected JSON body:
     {
-        "question": "How much PTO do I get?"
+        "question": "How much PTO do I get?",
+        "filter": {"doc_id": "POL-001"}  (optional)
     }
 
     Returns:
@@ -137,8 +177,16 @@ def chat():
                 "error": "Question too long (max 500 characters)"
             }), 400
 
+        # Validate optional metadata filter
+        try:
+            where = normalize_filter(data.get('filter'))
+        except ValueError as e:
+            return jsonify({
+                "error": f"Invalid filter: {e}"
+            }), 400
+
         # Get answer from RAG pipeline
-        response = rag_pipeline.answer(question)
+        response = rag_pipeline.answer(question, where=where)
 
         # Calculate latency
         latency_ms = int((time.time() - start_time) * 1000)
@@ -166,8 +214,12 @@ def search():
     Expected JSON body:
     {
         "query": "PTO policy",
-        "top_k": 5
+        "top_k": 5,
+        "filter": {"source": "pto_policy.md"}  (optional)
     }
+
+    Filters use ChromaDB "where" syntax over chunk metadata (doc_id, source,
+    heading, ...) with $eq, $ne, $in, $nin, $and and $or.
     """
     try:
         ensure_initialized()
@@ -187,8 +239,17 @@ def search():
                 "error": "Query cannot be empty"
             }), 400
 
+        # Validate optional metadata filter
+        try:
+            where = normalize_filter(data.get('filter'))
+        except ValueError as e:
+            return jsonify({
+                "error": f"Invalid filter: {e}"
+            }), 400
+
         # Search vector store
-        results = vector_store.search(query, k=top_k)
+        with index_lock.read():
+            results = vector_store.search(query, k=top_k, where=where)
 
         # Format results
         formatted_results = []
@@ -210,12 +271,87 @@ def search():
         }), 500
 
 
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Batch search endpoint for retrieving documents for several queries at once.
+
+    Expected JSON body:
+    {
+        "queries": ["PTO policy", "VPN requirements"],
+        "top_k": 5,
+        "filter": {"doc_id": "POL-002"}  (optional)
+    }
+    """
+    try:
+        ensure_initialized()
+
+        data = request.get_json()
+
+        if not data or not isinstance(data.get('queries'), list):
+            return jsonify({
+                "error": "Missing 'queries' list in request body"
+            }), 400
+
+        queries = [q.strip() if isinstance(q, str) else "" for q in data['queries']]
+        top_k = data.get('top_k', 5)
+
+        if not queries or not all(queries):
+            return jsonify({
+                "error": "Queries must be a non-empty list of non-empty strings"
+            }), 400
+
+        # Enforce batch size limit
+        if len(queries) > 100:
+            return jsonify({
+                "error": "Too many queries (max 100 per request)"
+            }), 400
+
+        # Validate optional metadata filter
+        try:
+            where = normalize_filter(data.get('filter'))
+        except ValueError as e:
+            return jsonify({
+                "error": f"Invalid filter: {e}"
+            }), 400
+
+        # Search vector store for all queries in one batch
+        with index_lock.read():
+            batch_results = vector_store.search_many(queries, k=top_k, where=where)
+
+        # Format results
+        formatted = []
+        for query, results in zip(queries, batch_results):
+            formatted.append({
+                "query": query,
+                "results": [
+                    {
+                        "content": doc.content,
+                        "metadata": doc.metadata,
+                        "similarity": float(score)
+                    }
+                    for doc, score in results
+                ]
+            })
+
+        return jsonify({
+            "results": formatted,
+            "count": len(formatted)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}"
+        }), 500
+
+
 @app.route('/stats', methods=['GET'])
 def stats():
     """Get vector store statistics."""
     try:
         ensure_initialized()
-        stats = vector_store.get_stats()
+        with index_lock.read():
+            stats = vector_store.get_stats()
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({
@@ -4,10 +4,18 @@ Setup script for initializing the RAG application.
 
 import os
 import sys
+from src.dedup import Deduplicator
 from src.document_processor import DocumentProcessor
 from src.vector_store import VectorStore
 
 
+def write_snapshot(store: VectorStore):
+    """Write the memory-mapped snapshot served with VECTOR_BACKEND=snapshot."""
+    snapshot_path = os.getenv("VECTOR_SNAPSHOT_PATH", "index_snapshot")
+    print(f"Writing index snapshot to {snapshot_path}...")
+    store.write_snapshot(snapshot_path)
+
+
 def setup_vector_store():
     """Initialize and populate the vector store."""
     print("="*80)
@@ -31,16 +39,51 @@ def setup_vector_store():
     for f in policy_files:
         print(f"  - {f}")
 
-    # Process documents
+    # Initialize vector store
     print("\n" + "-"*80)
-    print("Step 1: Processing and chunking documents...")
+    print("Step 1: Initializing vector store...")
     print("-"*80)
 
-    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
-    documents = processor.load_documents(policies_dir)
+    # The serving snapshot is built from a writable index
+    backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    store = VectorStore(persist_directory="chroma_db", backend="chroma" if backend == "snapshot" else backend)
+
+    # Check if already populated
+    full = True
+    stats = store.get_stats()
+    if stats['total_documents'] > 0:
+        print(f"\nVector store already contains {stats['total_documents']} documents.")
+        response = input("Reset and re-index from scratch? (y/N): ")
+        if response.lower() == 'y':
+            print("Resetting vector store...")
+            store.reset()
+        else:
+            full = False
+
+    # Process documents (only changed files when updating an existing index)
+    print("\n" + "-"*80)
+    print("Step 2: Processing and chunking documents...")
+    print("-"*80)
 
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    has_manifest = os.path.exists(processor.default_manifest_path())
+    changes = processor.load_changed_documents(policies_dir, full=full)
+    documents = changes.documents
+    for path, error in processor.load_errors.items():
+        print(f"Error loading {path}: {error}")
+
+    if not full:
+        print(f"\nFiles: {len(changes.added)} new, {len(changes.modified)} modified, "
+              f"{len(changes.deleted)} deleted, {len(changes.unchanged)} unchanged")
     print(f"\nProcessed {len(documents)} document chunks")
 
+    # Duplicates are only dropped within a file, so syncing one file never removes another's text
+    deduplicator = Deduplicator()
+    if deduplicator.enabled:
+        result = deduplicator.deduplicate(documents)
+        documents = result.documents
+        print(f"Dropped {result.removed} near-duplicate chunks (Jaccard >= {deduplicator.threshold})")
+
     # Show sample
     if documents:
         print("\nSample chunk:")
@@ -51,33 +94,27 @@ def setup_vector_store():
         print(f"  Length: {len(sample.content)} chars")
         print(f"  Preview: {sample.content[:150]}...")
 
-    # Initialize vector store
-    print("\n" + "-"*80)
-    print("Step 2: Initializing vector store...")
-    print("-"*80)
-
-    store = VectorStore(persist_directory="chroma_db")
-
-    # Check if already populated
-    stats = store.get_stats()
-    if stats['total_documents'] > 0:
-        print(f"\nVector store already contains {stats['total_documents']} documents.")
-        response = input("Reset and re-index? (y/N): ")
-        if response.lower() == 'y':
-            print("Resetting vector store...")
-            store.reset()
-        else:
-            print("Keeping existing index.")
-            print("\nSetup complete!")
-            return
-
     # Add documents to vector store
     print("\n" + "-"*80)
     print("Step 3: Generating embeddings and indexing...")
     print("-"*80)
-    print("\nThis may take a few minutes for first-time setup...")
 
-    store.add_documents(documents)
+    if full:
+        print("\nThis may take a few minutes for first-time setup...")
+        store.add_documents(documents)
+    else:
+        print("\nSyncing existing index with the changed policy documents...")
+        # Without a manifest every file was loaded, so the documents are the whole corpus
+        synced = store.sync_documents(documents, sources=changes.sources, full=not has_manifest)
+        print(f"  Added: {synced['added']}, updated: {synced['updated']}, "
+              f"removed: {synced['removed']}, unchanged: {synced['unchanged']}")
+
+    # Stop the embedding worker processes before writing the snapshot
+    store.embedder.close()
+
+    # Record what is indexed only once the index has been updated
+    processor.save_manifest(changes)
+    write_snapshot(store)
 
     # Show final stats
     final_stats = store.get_stats()
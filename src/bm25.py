@@ -0,0 +1,295 @@
+"""
+Lexical retrieval with an in-process BM25 inverted index.
+
+Policy questions often hinge on exact tokens ("401k", "POL-003",
+"$200/night", "VPN") that dense embeddings rank poorly. The BM25 index is
+built from the same chunks as the vector index, kept in sync with it and
+persisted alongside it; results are combined with dense retrieval through
+reciprocal-rank fusion. Index snapshots store it as memory-mapped arrays
+(MappedBM25Index), so opening one does not parse the postings.
+"""
+
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import List, Tuple, Optional, Iterable, Sequence
+import numpy as np
+
+
+# Keeps compound tokens such as "pol-003", "$200/night" and "401k" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9$]+(?:[-/.'][a-z0-9$]+)*")
+PART_SPLIT = re.compile(r"[-/.'$]")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i if in is it its my of on or
+our per the their this to was we what when where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase BM25 terms.
+
+    Compound tokens are kept whole and also contribute their parts, so
+    "$200/night" matches "$200/night", "200" and "night".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        parts = [part for part in PART_SPLIT.split(token) if part]
+        if parts != [token]:
+            terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """Incrementally updatable BM25 (Okapi) inverted index."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize BM25 index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc id: term frequency}
+        self.doc_terms = {}  # doc id -> its terms, so removal only touches their postings
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index documents, replacing any existing entries with the same ids."""
+        for doc_id, text in zip(ids, texts):
+            if doc_id in self.doc_lengths:
+                self.remove([doc_id])
+
+            term_counts = Counter(tokenize(text))
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, {})[doc_id] = count
+            self.doc_terms[doc_id] = list(term_counts)
+
+            length = sum(term_counts.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+
+    def remove(self, ids: Iterable[str]):
+        """Remove documents from the index (unknown ids are ignored)."""
+        for doc_id in set(ids):
+            if doc_id not in self.doc_lengths:
+                continue
+            for term in self.doc_terms.pop(doc_id):
+                postings = self.postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 5, allowed_ids: Optional[set] = None) -> List[Tuple[str, float]]:
+        """
+        Score documents against a query.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            allowed_ids: Optional set restricting which documents may match
+
+        Returns:
+            List of (id, score) tuples, best first
+        """
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+
+        avg_length = self.total_length / n_docs
+        scores = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if allowed_ids is not None and doc_id not in allowed_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def save(self, path: str):
+        """Persist the index as JSON (written atomically)."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index saved with ``save``."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = data["postings"]
+        index.total_length = sum(index.doc_lengths.values())
+        index.doc_terms = {doc_id: [] for doc_id in index.doc_lengths}
+        for term, postings in index.postings.items():
+            for doc_id in postings:
+                index.doc_terms[doc_id].append(term)
+        return index
+
+
+class MappedBM25Index:
+    """
+    Read-only BM25 index over memory-mapped arrays, as stored in index snapshots.
+
+    Postings are kept per term in CSR form: row numbers and term frequencies,
+    sliced by term offsets. Rows follow the snapshot's record order. Opening
+    the index reads only the vocabulary; scores match BM25Index.
+    """
+
+    VOCABULARY_FILE = "bm25_vocabulary.json"
+    OFFSETS_FILE = "bm25_term_offsets.npy"
+    ROWS_FILE = "bm25_rows.npy"
+    TFS_FILE = "bm25_tfs.npy"
+    LENGTHS_FILE = "bm25_doc_lengths.npy"
+
+    def __init__(self, directory: str, ids: Sequence[str]):
+        """
+        Open a mapped index.
+
+        Args:
+            directory: Directory written by ``write``
+            ids: Chunk id of each row (e.g. the snapshot's id column)
+        """
+        with open(os.path.join(directory, self.VOCABULARY_FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.k1 = data["k1"]
+        self.b = data["b"]
+        self.n_docs = data["n_docs"]
+        self.total_length = data["total_length"]
+        self.terms = {term: i for i, term in enumerate(data["terms"])}
+        self.ids = ids
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode='r')
+
+        self.term_offsets = load(self.OFFSETS_FILE)
+        self.rows = load(self.ROWS_FILE)
+        self.tfs = load(self.TFS_FILE)
+        self.doc_lengths = load(self.LENGTHS_FILE)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.VOCABULARY_FILE))
+
+    @classmethod
+    def write(cls, index: BM25Index, directory: str, ids: List[str]):
+        """
+        Write a BM25Index as mapped arrays whose rows follow ``ids``.
+
+        Args:
+            index: Index to convert
+            directory: Output directory
+            ids: Chunk id of each row
+        """
+        rows_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+        terms = sorted(index.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        rows, tfs = [], []
+        for i, term in enumerate(terms):
+            postings = sorted(
+                (rows_by_id[doc_id], tf) for doc_id, tf in index.postings[term].items() if doc_id in rows_by_id
+            )
+            rows.extend(row for row, _ in postings)
+            tfs.extend(tf for _, tf in postings)
+            offsets[i + 1] = len(rows)
+
+        lengths = np.array([index.doc_lengths.get(doc_id, 0) for doc_id in ids], dtype=np.int32)
+        np.save(os.path.join(directory, cls.OFFSETS_FILE), offsets)
+        np.save(os.path.join(directory, cls.ROWS_FILE), np.array(rows, dtype=np.int32))
+        np.save(os.path.join(directory, cls.TFS_FILE), np.array(tfs, dtype=np.int32))
+        np.save(os.path.join(directory, cls.LENGTHS_FILE), lengths)
+        with open(os.path.join(directory, cls.VOCABULARY_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": index.k1,
+                "b": index.b,
+                "n_docs": sum(doc_id in index.doc_lengths for doc_id in ids),
+                "total_length": int(lengths.sum()),
+                "terms": terms
+            }, f)
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def search(self, query: str, k: int = 5, allowed_ids: Optional[set] = None) -> List[Tuple[str, float]]:
+        """Score documents against a query (see ``BM25Index.search``)."""
+        if not self.n_docs:
+            return []
+
+        avg_length = self.total_length / self.n_docs
+        matched_rows, matched_scores = [], []
+        for term in set(tokenize(query)):
+            index = self.terms.get(term)
+            if index is None:
+                continue
+
+            start, end = int(self.term_offsets[index]), int(self.term_offsets[index + 1])
+            rows = np.asarray(self.rows[start:end])
+            tf = self.tfs[start:end].astype(np.float64)
+            idf = math.log(1 + (self.n_docs - (end - start) + 0.5) / (end - start + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / avg_length)
+            matched_rows.append(rows)
+            matched_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not matched_rows:
+            return []
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+
+        if allowed_ids is None and len(scores) > k:
+            # Only rows that can make the top k (including ties) need their ids decoded
+            keep = scores >= np.partition(scores, len(scores) - k)[len(scores) - k]
+            rows, scores = rows[keep], scores[keep]
+
+        scored = [(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+        if allowed_ids is not None:
+            scored = [item for item in scored if item[0] in allowed_ids]
+        return sorted(scored, key=lambda item: (-item[1], item[0]))[:k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists with reciprocal-rank fusion.
+
+    Each list contributes 1 / (k + rank) for every id it contains.
+
+    Args:
+        rankings: Ranked lists of ids, best first
+        k: RRF constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        List of (id, fused score) tuples, best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,191 @@
+"""
+Near-duplicate chunk elimination with MinHash and locality-sensitive hashing.
+
+Chunks are compared by the Jaccard similarity of their word 5-gram
+shingles. Each chunk gets a MinHash signature, and signatures are split into
+LSH bands so only chunks that share a band are compared. Candidate pairs are
+then checked against their exact shingle Jaccard. The first chunk of each
+group of near-duplicates is kept.
+
+Only chunks of the same file (``metadata['file_path']``) are compared.
+Incremental syncs re-index one file at a time, so a chunk dropped in favour
+of a copy in another file would vanish from the index when that other file
+changed.
+"""
+
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from itertools import groupby
+from typing import List, Dict, Optional, Set, Tuple, Iterable, Iterator
+import numpy as np
+
+from src.document_processor import Document
+
+
+# Mersenne prime for the universal hash family; keeps a * x below 2**62
+_PRIME = (1 << 31) - 1
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class DedupResult:
+    """Chunks left after deduplication and what was dropped."""
+    documents: List[Document]
+    removed: int = 0  # Number of dropped chunks
+
+
+class Deduplicator:
+    """MinHash/LSH near-duplicate filter for document chunks."""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        seed: int = 0
+    ):
+        """
+        Initialize deduplicator.
+
+        Args:
+            threshold: Jaccard similarity at or above which chunks are duplicates
+                       (or set DEDUP_THRESHOLD; 0 disables deduplication)
+            num_perm: Number of MinHash permutations
+            shingle_size: Words per shingle
+            seed: Random seed for the hash functions
+        """
+        if threshold is None:
+            threshold = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        if not 0 <= threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = self._band_layout(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    @staticmethod
+    def _band_layout(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """
+        Choose LSH bands and rows per band for a similarity threshold.
+
+        Pairs become candidates with probability 1 - (1 - s**rows)**bands,
+        which rises steeply around (1 / bands) ** (1 / rows). The layout puts
+        that point a little below the threshold so true duplicates are rarely
+        missed; candidates are verified exactly afterwards.
+        """
+        target = max(threshold - 0.1, 0.05)
+        layouts = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+        return min(layouts, key=lambda layout: abs((1 / layout[0]) ** (1 / layout[1]) - target))
+
+    def shingles(self, text: str) -> Set[int]:
+        """Hashed word n-grams of a text (a single shingle for very short texts)."""
+        words = _WORD_PATTERN.findall(text.lower())
+        n = self.shingle_size
+        grams = [" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))]
+        return {zlib.crc32(gram.encode()) & _PRIME for gram in grams}
+
+    def signature(self, shingles: Set[int]) -> np.ndarray:
+        """MinHash signature of a shingle set, shape (num_perm,)."""
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        hashes = (self._a[:, np.newaxis] * x[np.newaxis, :] + self._b[:, np.newaxis]) % _PRIME
+        return hashes.min(axis=1)
+
+    def deduplicate(self, documents: List[Document]) -> DedupResult:
+        """
+        Drop near-duplicate chunks within each file, keeping the first of each group.
+
+        Args:
+            documents: Chunks in ingestion order (a list or DocumentBatch)
+
+        Returns:
+            DedupResult with the kept chunks in their original order
+        """
+        if not self.enabled or len(documents) < 2:
+            return DedupResult(documents=list(documents))
+
+        # One pass over the chunks; only the kept ones are returned as Documents
+        shingle_sets, files = [], []
+        for doc in documents:
+            shingle_sets.append(self.shingles(doc.content))
+            files.append(doc.metadata.get('file_path', ''))
+        signatures = np.stack([self.signature(s) for s in shingle_sets])
+
+        # Union near-duplicates, always keeping the earliest chunk as the root
+        parent = list(range(len(documents)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        checked = set()
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = {}
+            rows = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for i, key in enumerate(map(bytes, rows)):
+                buckets.setdefault(key, []).append(i)
+
+            for members in buckets.values():
+                for position, i in enumerate(members):
+                    for j in members[position + 1:]:
+                        if files[i] != files[j] or (i, j) in checked:
+                            continue
+                        checked.add((i, j))
+                        if self._jaccard(shingle_sets[i], shingle_sets[j]) >= self.threshold:
+                            root_i, root_j = find(i), find(j)
+                            if root_i != root_j:
+                                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        kept = [documents[i] for i in range(len(parent)) if find(i) == i]
+        return DedupResult(documents=kept, removed=len(parent) - len(kept))
+
+    def iter_deduplicate(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Lazily drop near-duplicate chunks from a stream of chunks.
+
+        Chunks of a file arrive together (as from
+        ``DocumentProcessor.iter_documents``), so only one file's chunks are
+        held at a time.
+
+        Args:
+            documents: Chunks in ingestion order
+
+        Yields:
+            Kept chunks in their original order
+        """
+        if not self.enabled:
+            yield from documents
+            return
+        for _, file_documents in groupby(documents, key=lambda doc: doc.metadata.get('file_path', '')):
+            yield from self.deduplicate(list(file_documents)).documents
+
+    @staticmethod
+    def _jaccard(a: Set[int], b: Set[int]) -> float:
+        return len(a & b) / len(a | b) if a or b else 1.0
+
+
+if __name__ == "__main__":
+    from src.document_processor import DocumentProcessor
+
+    # Measure how much of the policy corpus is near-duplicate
+    docs = DocumentProcessor(chunk_size=1000, chunk_overlap=200).load_documents("data/policies")
+    deduplicator = Deduplicator()
+    result = deduplicator.deduplicate(docs)
+
+    print(f"Threshold {deduplicator.threshold} ({deduplicator.bands} bands x {deduplicator.rows} rows)")
+    print(f"Kept {len(result.documents)} of {len(docs)} chunks ({result.removed} near-duplicates dropped)")
+    before = sum(len(doc.content) for doc in docs)
+    after = sum(len(doc.content) for doc in result.documents)
+    print(f"Indexed text: {before} -> {after} chars")
@@ -4,23 +4,79 @@ Document processing module for ingesting and chunking policy documents.
 
 import os
 import re
+import sys
+import json
+import multiprocessing
+from array import array
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple, Iterable, Iterator
+from dataclasses import dataclass
 import hashlib
 
 # Document parsing
-import markdown
 from bs4 import BeautifulSoup
 from pypdf import PdfReader
 
+from src.embeddings import EmbeddingTokenizer
+
+
+# Start method for the file loading pool; spawn avoids forking a process
+# that already holds torch/OpenMP thread pools.
+POOL_START_METHOD = "spawn"
+
+# Loader method for each supported file suffix
+LOADERS = {
+    '.md': '_load_markdown',
+    '.pdf': '_load_pdf',
+    '.html': '_load_html',
+    '.htm': '_load_html',
+    '.txt': '_load_text',
+}
+
+# CPU-heavy formats parsed in worker processes; cheaper files are parsed inline
+# because a pool round trip would cost more than the parse itself
+PARALLEL_SUFFIXES = {'.pdf', '.html', '.htm'}
+
+# PDFs with at least this many pages have their pages extracted in parallel
+# (or set PDF_PARALLEL_PAGES)
+PDF_PARALLEL_PAGES = 64
+
+# Bump when chunking logic changes so the ingestion manifest re-chunks every file
+CHUNKER_VERSION = 4
+
+# Paragraphs tokenized per batched tokenizer call when chunking by tokens
+TOKENIZE_BATCH_SIZE = 256
+
+# ATX headings ("## Title", optionally closed with #s) and code fence openers
+HEADING_PATTERN = re.compile(r'^(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$')
+FENCE_PATTERN = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+# Markdown sections shorter than this are merged into the following section
+MIN_SECTION_CHARS = 100
+MANIFEST_VERSION = 1
+
 
 class Document:
     """Represents a document chunk with metadata."""
 
-    def __init__(self, content: str, metadata: Dict[str, str]):
+    # No per-instance __dict__; ingestion can hold 100k+ chunks
+    __slots__ = ("content", "metadata", "_id")
+
+    def __init__(self, content: str, metadata: Dict[str, str], id: Optional[str] = None):
         self.content = content
         self.metadata = metadata
-        self.id = self._generate_id()
+        self._id = id
+
+    @property
+    def id(self) -> str:
+        """Chunk id, computed on first access unless given (e.g. when read back from the index)."""
+        if self._id is None:
+            self._id = self._generate_id()
+        return self._id
 
     def _generate_id(self) -> str:
         """Generate unique ID for chunk based on content and metadata."""
@@ -28,52 +84,498 @@ class Document:
         return hashlib.md5(hash_input.encode()).hexdigest()
 
 
+class DocumentBatch:
+    """
+    Columnar container for large sets of chunks.
+
+    Texts are kept in one UTF-8 buffer with end offsets, and metadata as a
+    table of unique entries referenced by index, so chunks of the same file
+    and section share one copy. A batch costs little more than its text.
+    Documents are built on access and get their own metadata dict, which is
+    safe to modify. Ids already computed on added chunks are kept, so they
+    are not hashed again.
+    """
+
+    __slots__ = ("_buffer", "_offsets", "_metadata", "_metadata_lookup", "_metadata_index", "_ids")
+
+    def __init__(self, documents: Iterable[Document] = ()):
+        """
+        Initialize document batch.
+
+        Args:
+            documents: Chunks to add (consumed lazily, so a generator is never
+                       held in memory as Document objects)
+        """
+        self._buffer = bytearray()
+        self._offsets = array('q', [0])
+        self._metadata: List[Tuple] = []  # Unique metadata as item tuples
+        self._metadata_lookup: Dict[Tuple, int] = {}
+        self._metadata_index = array('l')
+        self._ids: Optional[List[Optional[str]]] = None  # Only allocated once a chunk has an id
+        self.extend(documents)
+
+    def append(self, document: Document):
+        """Add one chunk."""
+        if document._id is not None and self._ids is None:
+            self._ids = [None] * len(self)
+        if self._ids is not None:
+            self._ids.append(document._id)
+
+        self._buffer += document.content.encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+        items = tuple(document.metadata.items())
+        index = self._metadata_lookup.get(items)
+        if index is None:
+            index = self._metadata_lookup[items] = len(self._metadata)
+            self._metadata.append(items)
+        self._metadata_index.append(index)
+
+    def extend(self, documents: Iterable[Document]):
+        """Add chunks in order."""
+        for document in documents:
+            self.append(document)
+
+    def __len__(self) -> int:
+        return len(self._metadata_index)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self._document(index)
+
+    def __iter__(self) -> Iterator[Document]:
+        for i in range(len(self)):
+            yield self._document(i)
+
+    def _document(self, index: int) -> Document:
+        doc_id = self._ids[index] if self._ids is not None else None
+        return Document(content=self.text(index), metadata=self.metadata(index), id=doc_id)
+
+    def text(self, index: int) -> str:
+        """Content of one chunk."""
+        return self._buffer[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def metadata(self, index: int) -> Dict[str, str]:
+        """A fresh metadata dict for one chunk."""
+        return dict(self._metadata[self._metadata_index[index]])
+
+    def texts(self) -> Iterator[str]:
+        """Chunk contents in order, without building Document objects."""
+        for i in range(len(self)):
+            yield self.text(i)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the text buffer and offset/index columns (excluding the metadata table)."""
+        return (
+            len(self._buffer)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._metadata_index.itemsize * len(self._metadata_index)
+        )
+
+
+def _intern_metadata(metadata: Dict) -> Dict:
+    """Intern string metadata values so chunks of one file share a single copy."""
+    return {key: sys.intern(value) if isinstance(value, str) else value for key, value in metadata.items()}
+
+
+# Set in file loading pool workers so they do not start nested page pools
+_in_pool_worker = False
+
+
+def _init_pool_worker():
+    """Mark a file loading pool worker process."""
+    global _in_pool_worker
+    _in_pool_worker = True
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF (runs in a pool worker)."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+@dataclass
+class MarkdownSection:
+    """A Markdown heading and the text up to the next heading of any level."""
+    heading: str
+    level: int  # 1-6, or 0 for text before the first heading
+    heading_path: List[str]  # Titles from the top-level heading down to this one
+    start: int  # Offset of the heading line in the source
+    end: int  # Offset where the next section starts
+
+
+def parse_markdown_sections(content: str) -> List[MarkdownSection]:
+    """
+    Split Markdown into sections in a single pass over its lines.
+
+    Headings of every level start a new section; ``heading_path`` tracks
+    the enclosing headings. Lines inside fenced code blocks are never
+    treated as headings.
+
+    Args:
+        content: Markdown source
+
+    Returns:
+        Sections in document order, covering the whole source
+    """
+    sections = []
+    stack = []  # (level, title) of the enclosing headings
+    current = MarkdownSection("", 0, [], 0, 0)
+    fence = None
+    offset = 0
+
+    for line in content.splitlines(keepends=True):
+        text = line.rstrip('\r\n')
+        fence_match = FENCE_PATTERN.match(text)
+        if fence:
+            # A fence closes with at least as many of the same character
+            if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                fence = None
+        elif fence_match:
+            fence = fence_match.group(1)
+        else:
+            match = HEADING_PATTERN.match(text)
+            if match:
+                current.end = offset
+                if current.end > current.start:
+                    sections.append(current)
+
+                level, title = len(match.group(1)), match.group(2).strip()
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, title))
+                current = MarkdownSection(title, level, [t for _, t in stack], offset, offset)
+        offset += len(line)
+
+    current.end = offset
+    if current.end > current.start or not sections:
+        sections.append(current)
+    return sections
+
+
+@dataclass
+class DocumentChanges:
+    """Delta between a document directory and its ingestion manifest."""
+    documents: Iterable[Document]  # Chunks of added and modified files
+    added: List[str]  # Relative paths of new files
+    modified: List[str]  # Relative paths of changed files
+    deleted: List[str]  # Relative paths of removed files
+    unchanged: List[str]  # Relative paths of files that were skipped
+    manifest: Dict  # Manifest describing the directory once the changes are applied
+    directory: str = ""  # Directory the relative paths are under
+
+    @property
+    def sources(self) -> Set[str]:
+        """
+        Files (``metadata['file_path']``) whose chunks must be replaced in the index.
+
+        Keyed on the path rather than the file name, so same-named files in
+        different folders stay separate.
+        """
+        return {str(Path(self.directory) / path) for path in self.added + self.modified + self.deleted}
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+
 class DocumentProcessor:
     """Handles document parsing, cleaning, and chunking."""
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        max_workers: Optional[int] = None,
+        tokenizer: Optional[EmbeddingTokenizer] = None,
+        chunk_tokens: Optional[int] = None,
+        chunk_overlap_tokens: Optional[int] = None
+    ):
         """
         Initialize document processor.
 
         Args:
             chunk_size: Target size of chunks in characters
             chunk_overlap: Overlap between chunks in characters
+            max_workers: Maximum worker processes for parsing PDF and HTML files
+                         (or set INGEST_MAX_WORKERS; defaults to the CPU count)
+            tokenizer: Embedding tokenizer; when given (or CHUNK_UNIT=tokens),
+                       chunks are sized in embedding tokens instead of characters
+            chunk_tokens: Token budget per chunk (or set CHUNK_TOKENS; defaults to
+                          what the embedding model keeps, max_seq_length minus
+                          special tokens)
+            chunk_overlap_tokens: Overlap between chunks in tokens (or set
+                                  CHUNK_OVERLAP_TOKENS; defaults to the same
+                                  fraction of the chunk as chunk_overlap)
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
 
-    def load_documents(self, directory: str) -> List[Document]:
+        if tokenizer is None and os.getenv("CHUNK_UNIT", "chars").lower() == "tokens":
+            tokenizer = EmbeddingTokenizer()
+        self.tokenizer = tokenizer
+        self.chunk_tokens = self.chunk_overlap_tokens = None
+        if tokenizer is not None:
+            self.chunk_tokens = (
+                chunk_tokens or int(os.getenv("CHUNK_TOKENS", "0"))
+                or tokenizer.max_seq_length - tokenizer.special_tokens
+            )
+            if chunk_overlap_tokens is None:
+                default_overlap = round(self.chunk_tokens * chunk_overlap / chunk_size)
+                chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", str(default_overlap)))
+            if not 0 <= chunk_overlap_tokens < self.chunk_tokens:
+                raise ValueError("chunk_overlap_tokens must be smaller than chunk_tokens")
+            self.chunk_overlap_tokens = chunk_overlap_tokens
+
+        if max_workers is None:
+            max_workers = int(os.getenv("INGEST_MAX_WORKERS", "0")) or os.cpu_count() or 1
+        self.max_workers = max_workers
+        # {file path: error message} for files that failed in the last load
+        self.load_errors = {}
+
+    def load_documents(self, directory: str, max_workers: Optional[int] = None) -> List[Document]:
         """
         Load all documents from a directory.
 
+        PDF and HTML files are parsed in a process pool; the result is in
+        sorted path order regardless of how many workers are used. Files
+        that fail to load are skipped and recorded in ``self.load_errors``.
+
         Args:
             directory: Path to directory containing documents
+            max_workers: Override the processor's maximum worker count
 
         Returns:
             List of Document objects
         """
-        documents = []
-        directory_path = Path(directory)
-
-        for file_path in directory_path.rglob('*'):
-            if file_path.is_file():
-                try:
-                    if file_path.suffix.lower() == '.md':
-                        docs = self._load_markdown(file_path)
-                    elif file_path.suffix.lower() == '.pdf':
-                        docs = self._load_pdf(file_path)
-                    elif file_path.suffix.lower() in ['.html', '.htm']:
-                        docs = self._load_html(file_path)
-                    elif file_path.suffix.lower() == '.txt':
-                        docs = self._load_text(file_path)
-                    else:
-                        continue
-
-                    documents.extend(docs)
-                except Exception as e:
-                    print(f"Error loading {file_path}: {e}")
-
-        return documents
+        return list(self.iter_documents(directory, max_workers))
+
+    def _list_files(self, directory: str) -> List[Path]:
+        """Supported files under a directory in sorted path order."""
+        return sorted(
+            (path for path in Path(directory).rglob('*')
+             if path.is_file() and path.suffix.lower() in LOADERS),
+            key=lambda path: path.as_posix()
+        )
+
+    def iter_documents(self, directory: str, max_workers: Optional[int] = None) -> Iterator[Document]:
+        """
+        Lazily load and chunk all documents from a directory.
+
+        Yields the same chunks in the same order as ``load_documents`` while
+        holding only a bounded number of parsed files in memory.
+
+        Args:
+            directory: Path to directory containing documents
+            max_workers: Override the processor's maximum worker count
+
+        Yields:
+            Document objects
+        """
+        for _, docs in self._iter_loaded(self._list_files(directory), max_workers):
+            if docs:
+                yield from docs
+
+    def _iter_loaded(
+        self,
+        paths: List[Path],
+        max_workers: Optional[int] = None
+    ) -> Iterator[Tuple[Path, Optional[List[Document]]]]:
+        """
+        Load files in order, parsing PDF and HTML files ahead in a process pool.
+
+        At most ``2 * max_workers`` files are submitted ahead of the one being
+        yielded, which bounds memory while keeping the pool busy. Failures are
+        recorded in ``self.load_errors`` and yielded as None.
+
+        Yields:
+            (path, chunks) tuples in input order
+        """
+        self.load_errors = {}
+        max_workers = max_workers or self.max_workers
+        n_parallel = sum(path.suffix.lower() in PARALLEL_SUFFIXES for path in paths)
+        if max_workers <= 1 or n_parallel <= 1:
+            n_parallel = 0
+        window = 2 * max_workers
+
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, n_parallel),
+            mp_context=multiprocessing.get_context(POOL_START_METHOD),
+            initializer=_init_pool_worker
+        ) if n_parallel else nullcontext() as executor:
+            pending = deque()  # (path, future or None for inline parsing)
+            for path in paths:
+                future = None
+                if n_parallel and path.suffix.lower() in PARALLEL_SUFFIXES:
+                    future = executor.submit(self._load_file, path)
+                pending.append((path, future))
+
+                # Light files are parsed here while the pool works ahead
+                while pending and (pending[0][1] is None or len(pending) > window):
+                    yield self._collect(*pending.popleft())
+
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    def _collect(self, path: Path, future) -> Tuple[Path, Optional[List[Document]]]:
+        """Parse a file inline or wait for its pool result, recording failures."""
+        try:
+            return path, future.result() if future is not None else self._load_file(path)
+        except Exception as e:
+            self.load_errors[str(path)] = str(e)
+            return path, None
+
+    def _chunker_settings(self) -> Dict:
+        """Settings that determine how a file is chunked."""
+        settings = {
+            "chunker_version": CHUNKER_VERSION,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap
+        }
+        if self.tokenizer is not None:
+            settings.update({
+                "tokenizer": getattr(self.tokenizer, "model_name", type(self.tokenizer).__name__),
+                "chunk_tokens": self.chunk_tokens,
+                "chunk_overlap_tokens": self.chunk_overlap_tokens
+            })
+        return settings
+
+    def default_manifest_path(self) -> str:
+        """Manifest location (INGEST_MANIFEST_PATH, stored with the index by default)."""
+        return os.getenv("INGEST_MANIFEST_PATH", os.path.join("chroma_db", "ingest_manifest.json"))
+
+    def load_changed_documents(
+        self,
+        directory: str,
+        manifest_path: Optional[str] = None,
+        full: bool = False,
+        max_workers: Optional[int] = None,
+        stream: bool = False
+    ) -> DocumentChanges:
+        """
+        Load only the files that changed since the last saved ingestion manifest.
+
+        Files whose size and mtime match the manifest are skipped without
+        being read; otherwise the content hash decides whether they changed.
+        Changing the chunker settings marks every file as modified. Apply the
+        result to the index (e.g. ``VectorStore.sync_documents(changes.documents,
+        sources=changes.sources)``) and then call ``save_manifest`` so a
+        failed run is retried.
+
+        Args:
+            directory: Path to directory containing documents
+            manifest_path: Manifest file (defaults to ``default_manifest_path()``)
+            full: Ignore the saved manifest and load every file
+            max_workers: Override the processor's maximum worker count
+            stream: Return ``documents`` as a generator that loads files as it
+                    is consumed (e.g. by ``VectorStore.add_documents_stream``);
+                    the manifest and file lists are complete once it is exhausted.
+                    Otherwise ``documents`` is a ``DocumentBatch``
+
+        Returns:
+            DocumentChanges with the chunks of added and modified files
+        """
+        manifest_path = manifest_path or self.default_manifest_path()
+        previous = {} if full else self._read_manifest(manifest_path)
+        settings = self._chunker_settings()
+        previous_files = previous.get("files", {}) if previous.get("settings") == settings else {}
+
+        entries, added, modified, unchanged = {}, [], [], []
+        to_load, present = [], set()
+        for path in self._list_files(directory):
+            relative = path.relative_to(directory).as_posix()
+            present.add(relative)
+            stat = path.stat()
+            entry = {"source": path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            old = previous_files.get(relative)
+
+            if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                entries[relative] = old
+                unchanged.append(relative)
+                continue
+
+            entry["sha256"] = self._hash_file(path)
+            if old and old["sha256"] == entry["sha256"]:
+                # Touched but not edited
+                entries[relative] = {**old, "mtime_ns": entry["mtime_ns"]}
+                unchanged.append(relative)
+                continue
+
+            (modified if relative in previous.get("files", {}) else added).append(relative)
+            to_load.append((relative, path, entry))
+
+        def load_changed():
+            loaded = self._iter_loaded([path for _, path, _ in to_load], max_workers)
+            for (relative, _, entry), (_, docs) in zip(to_load, loaded):
+                if docs is None:
+                    # Keep the old entry (if any) so the file is retried next time
+                    if relative in previous_files:
+                        entries[relative] = previous_files[relative]
+                    for changes in (added, modified):
+                        if relative in changes:
+                            changes.remove(relative)
+                    continue
+                entries[relative] = {**entry, "chunk_ids": [doc.id for doc in docs]}
+                yield from docs
+
+        documents = load_changed() if stream else DocumentBatch(load_changed())
+        deleted = sorted(set(previous.get("files", {})) - present)
+        return DocumentChanges(
+            documents=documents,
+            added=added,
+            modified=modified,
+            deleted=deleted,
+            unchanged=unchanged,
+            manifest={"version": MANIFEST_VERSION, "settings": settings, "files": entries},
+            directory=directory
+        )
+
+    def save_manifest(self, changes: DocumentChanges, manifest_path: Optional[str] = None):
+        """
+        Persist the manifest of applied changes (written atomically).
+
+        Args:
+            changes: Result of ``load_changed_documents`` that has been indexed
+            manifest_path: Manifest file (defaults to ``default_manifest_path()``)
+        """
+        manifest_path = manifest_path or self.default_manifest_path()
+        directory = os.path.dirname(manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(changes.manifest, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+    def _read_manifest(self, manifest_path: str) -> Dict:
+        """Load a saved manifest (empty if missing or from another format version)."""
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """SHA-256 of a file's bytes."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _load_file(self, file_path: Path) -> List[Document]:
+        """Load and chunk one file with the loader for its suffix."""
+        return getattr(self, LOADERS[file_path.suffix.lower()])(file_path)
 
     def _load_markdown(self, file_path: Path) -> List[Document]:
         """Load and chunk a markdown file."""
@@ -83,30 +585,55 @@ class DocumentProcessor:
         # Extract document ID and metadata from markdown
         doc_id = self._extract_doc_id(content)
 
-        # Convert markdown to plain text but preserve structure
-        html = markdown.markdown(content)
-        text = self._html_to_text(html)
-
-        # Clean and normalize text
-        text = self._clean_text(text)
-
         # Chunk by headings first, then by size if needed
-        chunks = self._chunk_by_headings(content, file_path, doc_id)
-
-        return chunks
+        return self._chunk_by_headings(content, file_path, doc_id)
 
     def _load_pdf(self, file_path: Path) -> List[Document]:
-        """Load and chunk a PDF file."""
-        reader = PdfReader(file_path)
-        text = ""
-
-        for page in reader.pages:
-            text += page.extract_text() + "\n\n"
+        """
+        Load and chunk a PDF file page by page.
 
-        text = self._clean_text(text)
+        Chunks are built incrementally as pages are extracted (a chunk may
+        span a page boundary) and record ``page_start``/``page_end``
+        (1-based) in their metadata.
+        """
         doc_id = self._extract_doc_id_from_filename(file_path)
+        paragraphs = (
+            (para, page_number)
+            for page_number, text in enumerate(self._iter_pdf_pages(file_path), start=1)
+            for para in self._clean_text(text).split('\n\n') if para
+        )
+        return list(self._iter_chunks(paragraphs, file_path, doc_id))
+
+    def _iter_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        """
+        Yield the text of each page in order.
 
-        return self._chunk_text(text, file_path, doc_id)
+        Large PDFs loaded outside the file pool are split into page ranges
+        that are extracted in parallel worker processes.
+        """
+        reader = PdfReader(file_path)
+        n_pages = len(reader.pages)
+        min_pages = int(os.getenv("PDF_PARALLEL_PAGES", str(PDF_PARALLEL_PAGES)))
+
+        if _in_pool_worker or self.max_workers <= 1 or n_pages < min_pages:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+        range_size = -(-n_pages // (self.max_workers * 4))
+        starts = range(0, n_pages, range_size)
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(POOL_START_METHOD),
+            initializer=_init_pool_worker
+        ) as executor:
+            for texts in executor.map(
+                _extract_page_range,
+                [str(file_path)] * len(starts),
+                starts,
+                [min(start + range_size, n_pages) for start in starts]
+            ):
+                yield from texts
 
     def _load_html(self, file_path: Path) -> List[Document]:
         """Load and chunk an HTML file."""
@@ -171,59 +698,59 @@ class DocumentProcessor:
         """Generate document ID from filename."""
         return file_path.stem.upper()
 
+    def _chunk_metadata(self, file_path: Path, doc_id: str, heading: str = "", heading_path: str = "") -> Dict[str, str]:
+        """Metadata stored with every chunk."""
+        return _intern_metadata({
+            "source": str(file_path.name),
+            "doc_id": doc_id,
+            "heading": heading,
+            "heading_path": heading_path,
+            "file_path": str(file_path)
+        })
+
     def _chunk_by_headings(self, content: str, file_path: Path, doc_id: str) -> List[Document]:
         """
         Chunk markdown content by headings.
 
-        This preserves document structure by keeping sections together.
+        Every section of the heading tree becomes a chunk, so document
+        structure is preserved. Sections shorter than MIN_SECTION_CHARS
+        (e.g. a heading directly followed by a subheading) are merged into
+        the next section, and oversized sections are split by size.
         """
-        chunks = []
-
-        # Split by h1 and h2 headings
-        sections = re.split(r'\n(#{1,2}\s+.+)\n', content)
-
-        current_chunk = ""
-        current_heading = ""
-
-        for i, section in enumerate(sections):
-            if re.match(r'#{1,2}\s+', section):
-                # This is a heading
-                if current_chunk and len(current_chunk) > 100:
-                    # Save previous chunk
-                    chunks.append(Document(
-                        content=current_chunk.strip(),
-                        metadata={
-                            "source": str(file_path.name),
-                            "doc_id": doc_id,
-                            "heading": current_heading,
-                            "file_path": str(file_path)
-                        }
-                    ))
-                    current_chunk = ""
-
-                current_heading = section.strip('# ').strip()
-                current_chunk = section + "\n"
+        pieces = []  # (text, section it is filed under)
+        pending = ""
+        section = None
+        for section in parse_markdown_sections(content):
+            text = pending + content[section.start:section.end]
+            if len(text.strip()) < MIN_SECTION_CHARS:
+                pending = text
+                continue
+            pending = ""
+            pieces.append((text.strip(), section))
+
+        # Short trailing text joins the last chunk rather than being dropped
+        if pending.strip():
+            if pieces:
+                pieces[-1] = (pieces[-1][0] + "\n\n" + pending.strip(), pieces[-1][1])
             else:
-                # This is content
-                current_chunk += section
+                pieces.append((pending.strip(), section))
 
-                # If chunk is getting too large, split it
-                if len(current_chunk) > self.chunk_size * 1.5:
-                    sub_chunks = self._chunk_text_simple(current_chunk, file_path, doc_id, current_heading)
-                    chunks.extend(sub_chunks)
-                    current_chunk = ""
+        # Sections over the size limit are split further
+        if self.tokenizer is not None:
+            oversized = [count > self.chunk_tokens for count in self.tokenizer.count([text for text, _ in pieces])]
+        else:
+            oversized = [len(text) > self.chunk_size * 1.5 for text, _ in pieces]
 
-        # Add final chunk
-        if current_chunk and len(current_chunk) > 100:
-            chunks.append(Document(
-                content=current_chunk.strip(),
-                metadata={
-                    "source": str(file_path.name),
-                    "doc_id": doc_id,
-                    "heading": current_heading,
-                    "file_path": str(file_path)
-                }
-            ))
+        chunks = []
+        for (text, section), too_long in zip(pieces, oversized):
+            heading_path = " > ".join(section.heading_path)
+            if too_long:
+                chunks.extend(self._chunk_text_simple(text, file_path, doc_id, section.heading, heading_path))
+            else:
+                chunks.append(Document(
+                    content=text,
+                    metadata=self._chunk_metadata(file_path, doc_id, section.heading, heading_path)
+                ))
 
         return chunks
 
@@ -231,51 +758,183 @@ class DocumentProcessor:
         """Chunk text by size with overlap."""
         return self._chunk_text_simple(text, file_path, doc_id, heading)
 
-    def _chunk_text_simple(self, text: str, file_path: Path, doc_id: str, heading: str = "") -> List[Document]:
+    def _chunk_text_simple(
+        self,
+        text: str,
+        file_path: Path,
+        doc_id: str,
+        heading: str = "",
+        heading_path: str = ""
+    ) -> List[Document]:
         """Simple text chunking with overlap."""
-        chunks = []
-
         # Split by paragraphs first
-        paragraphs = text.split('\n\n')
+        paragraphs = ((para, None) for para in text.split('\n\n'))
+        return list(self._iter_chunks(paragraphs, file_path, doc_id, heading, heading_path))
+
+    def _iter_chunks(
+        self,
+        paragraphs: Iterable[Tuple[str, Optional[int]]],
+        file_path: Path,
+        doc_id: str,
+        heading: str = "",
+        heading_path: str = ""
+    ) -> Iterator[Document]:
+        """
+        Incrementally pack paragraphs into chunks of about chunk_size characters with overlap.
+
+        Args:
+            paragraphs: (text, page number or None) tuples in document order
+
+        Yields:
+            Document chunks; when page numbers are given, their metadata has
+            the first and last page the chunk draws from
+        """
+        if self.tokenizer is not None:
+            yield from self._iter_token_chunks(paragraphs, file_path, doc_id, heading, heading_path)
+            return
 
         current_chunk = ""
+        current_pages = []  # (word count, page) of each paragraph in the current chunk
+
+        def make_chunk() -> Document:
+            metadata = self._chunk_metadata(file_path, doc_id, heading, heading_path)
+            pages = [page for _, page in current_pages if page is not None]
+            if pages:
+                metadata["page_start"] = pages[0]
+                metadata["page_end"] = pages[-1]
+            return Document(content=current_chunk.strip(), metadata=metadata)
 
-        for para in paragraphs:
+        for para, page in paragraphs:
             # If adding this paragraph would exceed chunk size
             if len(current_chunk) + len(para) > self.chunk_size:
                 if current_chunk:
-                    chunks.append(Document(
-                        content=current_chunk.strip(),
-                        metadata={
-                            "source": str(file_path.name),
-                            "doc_id": doc_id,
-                            "heading": heading,
-                            "file_path": str(file_path)
-                        }
-                    ))
+                    yield make_chunk()
 
                     # Start new chunk with overlap from previous chunk
                     words = current_chunk.split()
                     overlap_words = words[-int(len(words) * (self.chunk_overlap / self.chunk_size)):]
                     current_chunk = ' '.join(overlap_words) + '\n\n' + para
+
+                    # The overlap starts on the page of the paragraph it reaches back into
+                    remaining, overlap_page = len(overlap_words), None
+                    for word_count, previous_page in reversed(current_pages):
+                        overlap_page = previous_page
+                        remaining -= word_count
+                        if remaining <= 0:
+                            break
+                    current_pages = [(len(overlap_words), overlap_page), (len(para.split()), page)]
                 else:
                     current_chunk = para
+                    current_pages = [(len(para.split()), page)]
             else:
                 current_chunk += '\n\n' + para if current_chunk else para
+                current_pages.append((len(para.split()), page))
 
         # Add final chunk
         if current_chunk:
-            chunks.append(Document(
-                content=current_chunk.strip(),
-                metadata={
-                    "source": str(file_path.name),
-                    "doc_id": doc_id,
-                    "heading": heading,
-                    "file_path": str(file_path)
-                }
-            ))
+            yield make_chunk()
+
+    def _iter_token_chunks(
+        self,
+        paragraphs: Iterable[Tuple[str, Optional[int]]],
+        file_path: Path,
+        doc_id: str,
+        heading: str = "",
+        heading_path: str = ""
+    ) -> Iterator[Document]:
+        """
+        Pack paragraphs into chunks of at most ``chunk_tokens`` embedding tokens.
 
-        return chunks
+        Paragraphs are measured in batched tokenizer calls. Paragraphs that
+        do not fit are cut at token boundaries, and each chunk starts with the
+        last ``chunk_overlap_tokens`` tokens of the previous one.
+        """
+        budget, overlap = self.chunk_tokens, self.chunk_overlap_tokens
+        pieces = []  # (text, token offsets within text, page) of the current chunk
+        size = 0
+
+        def make_chunk() -> Document:
+            metadata = self._chunk_metadata(file_path, doc_id, heading, heading_path)
+            pages = [page for _, _, page in pieces if page is not None]
+            if pages:
+                metadata["page_start"] = pages[0]
+                metadata["page_end"] = pages[-1]
+            content = '\n\n'.join(text for text, _, _ in pieces).strip()
+            return Document(content=content, metadata=metadata)
+
+        def tail(n: int) -> List[Tuple[str, List[Tuple[int, int]], Optional[int]]]:
+            # Last n tokens of the current chunk, as pieces
+            kept = []
+            for text, offsets, page in reversed(pieces):
+                if n <= 0:
+                    break
+                if len(offsets) > n:
+                    start = offsets[-n][0]
+                    text, offsets = text[start:], [(a - start, b - start) for a, b in offsets[-n:]]
+                kept.append((text, offsets, page))
+                n -= len(offsets)
+            return kept[::-1]
+
+        for batch in self._batched(paragraphs, TOKENIZE_BATCH_SIZE):
+            for (para, page), offsets in zip(batch, self.tokenizer.token_offsets([para for para, _ in batch])):
+                if len(offsets) <= budget:
+                    parts = [(para, offsets)]
+                else:
+                    # Windows that still fit after the overlap from the previous chunk
+                    window = budget - overlap
+                    parts = []
+                    for start in range(0, len(offsets), window):
+                        span = offsets[start:start + window]
+                        begin, end = span[0][0], span[-1][1]
+                        parts.append((para[begin:end], [(a - begin, b - begin) for a, b in span]))
+
+                for text, part_offsets in parts:
+                    if pieces and size + len(part_offsets) > budget:
+                        yield make_chunk()
+                        pieces = tail(min(overlap, budget - len(part_offsets)))
+                        size = sum(len(o) for _, o, _ in pieces)
+                    pieces.append((text, part_offsets, page))
+                    size += len(part_offsets)
+
+        if pieces:
+            yield make_chunk()
+
+    @staticmethod
+    def _batched(items: Iterable, size: int) -> Iterator[List]:
+        """Group an iterable into lists of at most ``size`` items."""
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+
+
+def truncation_report(documents: List[Document], tokenizer: EmbeddingTokenizer) -> Dict:
+    """
+    Measure how much chunk text the embedding model would cut off.
+
+    Args:
+        documents: Chunks to check
+        tokenizer: Tokenizer of the embedding model
+
+    Returns:
+        Chunk and token counts, including how many chunks exceed max_seq_length
+    """
+    counts = [int(count) + tokenizer.special_tokens for count in tokenizer.count([doc.content for doc in documents])]
+    limit = tokenizer.max_seq_length
+    total = sum(counts)
+    dropped = sum(max(count - limit, 0) for count in counts)
+    truncated = sum(count > limit for count in counts)
+    return {
+        "chunks": len(documents),
+        "truncated": truncated,
+        "truncated_pct": 100.0 * truncated / len(documents) if documents else 0.0,
+        "max_tokens": max(counts, default=0),
+        "total_tokens": total,
+        "dropped_tokens": dropped,
+        "dropped_pct": 100.0 * dropped / total if total else 0.0
+    }
 
 
 if __name__ == "__main__":
@@ -293,3 +952,13 @@ if __name__ == "__main__":
         print(f"Heading: {doc.metadata.get('heading', 'N/A')}")
         print(f"Content length: {len(doc.content)} chars")
         print(f"Content preview: {doc.content[:200]}...")
+
+    # Compare how much of each chunk the embedding model keeps
+    tokenizer = EmbeddingTokenizer()
+    token_docs = DocumentProcessor(tokenizer=tokenizer).load_documents("data/policies")
+    print(f"\nTruncation at max_seq_length={tokenizer.max_seq_length}:")
+    for label, chunks in (("characters", docs), ("tokens", token_docs)):
+        report = truncation_report(chunks, tokenizer)
+        print(f"  {label:>10}: {report['chunks']} chunks, {report['truncated']} truncated "
+              f"({report['truncated_pct']:.1f}%), {report['dropped_tokens']} tokens dropped "
+              f"({report['dropped_pct']:.1f}%)")
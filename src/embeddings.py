@@ -1,30 +1,772 @@
 """
 Embedding generation using free-tier models.
+
+Two interchangeable backends are supported (select with EMBEDDING_BACKEND):
+- "torch": sentence-transformers on PyTorch (default)
+- "onnx": an int8-quantized ONNX export run through onnxruntime, which
+  avoids importing torch and is considerably faster on small CPU boxes
 """
 
-from typing import List
+from typing import List, Dict, Optional, Tuple
 import os
-from sentence_transformers import SentenceTransformer
+import time
+import hashlib
+import queue
+import multiprocessing
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+import numpy as np
+
+
+# Start method for the ingestion worker pool; spawn avoids forking a process
+# that already holds torch/OpenMP thread pools.
+POOL_START_METHOD = "spawn"
+
+# Tokens the embedding model keeps per text, including special tokens
+# (reduced from the sentence-transformers default of 512 to save memory)
+MAX_SEQ_LENGTH = 256
+
+# Per-process model used by ingestion pool workers
+_worker_embedder = None
+
+
+def hub_repo_id(model_name: str) -> str:
+    """Hugging Face Hub repository of a sentence-transformers model name."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _init_embedding_worker(config: Dict):
+    """Load the embedding model once in a pool worker process."""
+    global _worker_embedder
+
+    # Apply thread limits before torch/onnxruntime are imported in this process
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(config["threads"])
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    _worker_embedder = EmbeddingModel(
+        model_name=config["model_name"],
+        backend=config["backend"],
+        cache_dir="",
+        query_cache_size=0,
+        batch_wait_ms=0,
+        token_budget=config["token_budget"],
+        max_batch_size=config["max_batch_size"],
+        num_workers=1
+    )
+    # sentence-transformers has imported torch by now; a failure above is
+    # raised as BrokenProcessPool in the parent rather than respawning workers
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(config["threads"])
+
+
+def _embed_shard(texts: List[str]) -> np.ndarray:
+    """Embed one shard of texts inside a pool worker."""
+    return _worker_embedder._encode_bucketed(texts)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of document embeddings.
+
+    Entries are keyed by model name plus a SHA-256 hash of the chunk text and
+    stored as float32 blobs in a small SQLite file. When the cache grows past
+    ``max_entries`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 50000):
+        """
+        Initialize embedding cache.
+
+        Args:
+            cache_dir: Directory holding the cache database
+            model_name: Name of the model the cached vectors belong to
+            max_entries: Maximum number of embeddings kept on disk
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "embeddings.sqlite3")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the content hash used as cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            Mapping of position in ``texts`` to cached embedding (hits only)
+        """
+        if not texts:
+            return {}
+
+        hashes = [self.hash_text(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            unique_hashes = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, text_hash) for text_hash in found]
+                )
+                self.conn.commit()
+
+        return {i: found[h] for i, h in enumerate(hashes) if h in found}
+
+    def put_many(self, texts: List[str], embeddings) -> None:
+        """
+        Store embeddings and evict old entries if the cache is full.
+
+        Args:
+            texts: Texts that were embedded
+            embeddings: Embedding vectors aligned with ``texts``
+        """
+        if not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (self.model_name, self.hash_text(text), np.asarray(emb, dtype=np.float32).tobytes(), now)
+            for text, emb in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond ``max_entries``."""
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+            ).fetchone()[0]
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe in-process LRU cache of query embeddings with a TTL.
+
+    Keys are query strings with whitespace collapsed. They are also
+    lowercased when the model's tokenizer lowercases its input (uncased
+    models), since only then does case never change the embedding.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600.0, lowercase: bool = False):
+        """
+        Initialize query cache.
+
+        Args:
+            max_size: Maximum number of cached queries
+            ttl_seconds: Seconds before an entry expires (0 means never)
+            lowercase: Treat queries that differ only in case as the same
+                       (only safe for uncased tokenizers)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lowercase = lowercase
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, query: str) -> str:
+        """Normalize query text into a cache key."""
+        return " ".join((query.lower() if self.lowercase else query).split())
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None on a miss."""
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, created = entry
+                if not self.ttl_seconds or time.monotonic() - created < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: np.ndarray) -> None:
+        """Store a query embedding, evicting the least recently used entry if full."""
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Get hit/miss statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class QueryBatcher:
+    """
+    Dynamic micro-batcher for concurrent query embeddings.
+
+    Callers block on ``embed`` while a background thread collects queries for
+    up to ``max_wait_ms`` milliseconds or ``max_batch_size`` items, encodes
+    them with one model call and hands each caller its own vector.
+    """
+
+    def __init__(self, encode_fn, max_wait_ms: float = 5.0, max_batch_size: int = 32):
+        """
+        Initialize query batcher.
+
+        Args:
+            encode_fn: Function mapping a list of texts to a 2D embedding array
+            max_wait_ms: Longest time the first query in a batch waits for company
+            max_batch_size: Maximum number of queries encoded together
+        """
+        self.encode_fn = encode_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.max_observed_batch = 0
+        self.total_wait = 0.0
+        self.max_wait_observed = 0.0
+
+    def _ensure_worker(self):
+        """Start the worker thread (again after a fork, e.g. gunicorn --preload)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+
+    def embed(self, query: str) -> np.ndarray:
+        """Embed one query as part of the next micro-batch."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, future, time.monotonic()))
+        return future.result()
+
+    def _run(self):
+        """Worker loop: gather a batch, encode it, fan results back out."""
+        work = self._queue
+        while True:
+            batch = [work.get()]
+            deadline = batch[0][2] + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            started = time.monotonic()
+            try:
+                embeddings = self.encode_fn([query for query, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            waits = [started - submitted for _, _, submitted in batch]
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_observed_batch = max(self.max_observed_batch, len(batch))
+                self.total_wait += sum(waits)
+                self.max_wait_observed = max(self.max_wait_observed, max(waits))
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def get_stats(self) -> Dict:
+        """Get batch size and queue wait statistics."""
+        with self._lock:
+            return {
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "queries": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.max_observed_batch,
+                "avg_queue_wait_ms": self.total_wait / self.items * 1000 if self.items else 0.0,
+                "max_queue_wait_ms": self.max_wait_observed * 1000
+            }
+
+
+class OnnxEmbeddingBackend:
+    """
+    Sentence embedding backend running a quantized ONNX model with onnxruntime.
+
+    Mirrors the parts of the SentenceTransformer API that EmbeddingModel uses
+    (``encode``, ``max_seq_length`` and ``get_sentence_embedding_dimension``)
+    and reproduces the mean pooling + L2 normalization of all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", onnx_file: Optional[str] = None):
+        """
+        Initialize ONNX backend.
+
+        Args:
+            model_name: Name of the sentence-transformers model on the Hugging Face Hub
+            onnx_file: ONNX file inside the model repo (or set EMBEDDING_ONNX_FILE)
+        """
+        # Optional dependencies, only needed for this backend
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo_id = hub_repo_id(model_name)
+        onnx_file = onnx_file or os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_padding()
+        self.max_seq_length = MAX_SEQ_LENGTH
+
+        # Honour the thread limits used for torch in low-RAM deployments
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("OMP_NUM_THREADS", "0") or 0)
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            hf_hub_download(repo_id, onnx_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.embedding_dim = self.session.get_outputs()[0].shape[-1]
+
+    @property
+    def max_seq_length(self) -> int:
+        return self._max_seq_length
+
+    @max_seq_length.setter
+    def max_seq_length(self, value: int):
+        self._max_seq_length = value
+        self.tokenizer.enable_truncation(max_length=value)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.embedding_dim
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Count tokens per text after truncation, ignoring padding."""
+        encodings = self.tokenizer.encode_batch(texts)
+        return np.array([sum(enc.attention_mask) for enc in encodings], dtype=np.int64)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run one padded batch through the ONNX session."""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([enc.ids for enc in encodings], dtype=np.int64)
+        attention_mask = np.array([enc.attention_mask for enc in encodings], dtype=np.int64)
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([enc.type_ids for enc in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over non-padding tokens, then L2 normalization
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        embeddings = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Encode one text or a list of texts.
+
+        Extra keyword arguments accepted by SentenceTransformer.encode are ignored.
+        """
+        if isinstance(sentences, str):
+            return self._encode_batch([sentences])[0]
+        if not sentences:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+
+        return np.concatenate([
+            self._encode_batch(sentences[i:i + batch_size])
+            for i in range(0, len(sentences), batch_size)
+        ])
+
+
+class EmbeddingTokenizer:
+    """
+    Fast tokenizer of an embedding model, loaded without the model weights.
+
+    Used to size chunks in the tokens the embedding model actually sees.
+    The tokenizer is loaded on first use and is not pickled, so instances
+    can be sent to ingestion pool workers.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", max_seq_length: int = MAX_SEQ_LENGTH):
+        """
+        Initialize embedding tokenizer.
+
+        Args:
+            model_name: Name of the sentence-transformers model on the Hugging Face Hub
+            max_seq_length: Tokens the embedding model keeps, including special tokens
+        """
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        self._tokenizer = None
+
+    def __getstate__(self):
+        return {**self.__dict__, "_tokenizer": None}
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+
+            self._tokenizer = Tokenizer.from_file(hf_hub_download(hub_repo_id(self.model_name), "tokenizer.json"))
+            self._tokenizer.no_padding()
+            self._tokenizer.no_truncation()
+        return self._tokenizer
+
+    @property
+    def special_tokens(self) -> int:
+        """Special tokens added around every input ([CLS] and [SEP])."""
+        return 2
+
+    def token_offsets(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        """
+        Character spans of the tokens of each text, in one batched call.
+
+        Args:
+            texts: Texts to tokenize
+
+        Returns:
+            One list of (start, end) character offsets per text, without special tokens
+        """
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [encoding.offsets for encoding in encodings]
+
+    def count(self, texts: List[str]) -> np.ndarray:
+        """Untruncated token counts per text, without special tokens."""
+        return np.array([len(offsets) for offsets in self.token_offsets(texts)], dtype=np.int64)
 
 
 class EmbeddingModel:
     """Wrapper for embedding models."""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        backend: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_max_entries: Optional[int] = None,
+        query_cache_size: Optional[int] = None,
+        query_cache_ttl: Optional[float] = None,
+        batch_wait_ms: Optional[float] = None,
+        max_query_batch: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        max_batch_size: int = 64,
+        num_workers: Optional[int] = None
+    ):
         """
         Initialize embedding model.
 
         Args:
             model_name: Name of the sentence-transformers model to use
                        Default is a good free model with 384 dimensions
+            backend: "torch" or "onnx" (or set EMBEDDING_BACKEND)
+            cache_dir: Directory for the on-disk document embedding cache
+                       (or set EMBEDDING_CACHE_DIR; empty string disables it)
+            cache_max_entries: Maximum number of cached document embeddings
+                       (or set EMBEDDING_CACHE_MAX_ENTRIES)
+            query_cache_size: Maximum number of cached query embeddings
+                       (or set QUERY_CACHE_SIZE; 0 disables the query cache)
+            query_cache_ttl: Seconds a cached query embedding stays valid
+                       (or set QUERY_CACHE_TTL)
+            batch_wait_ms: Micro-batching window for concurrent queries
+                       (or set QUERY_BATCH_WAIT_MS; 0 disables micro-batching)
+            max_query_batch: Maximum queries per micro-batch
+                       (or set QUERY_BATCH_MAX_SIZE)
+            token_budget: Maximum padded tokens per document batch, which bounds
+                       peak activation memory (or set EMBEDDING_TOKEN_BUDGET)
+            max_batch_size: Upper limit on documents per batch regardless of budget
+            num_workers: Worker processes used to embed large document sets
+                       (or set EMBEDDING_WORKERS; 1 keeps embedding in-process)
         """
         self.model_name = model_name
+        self.backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+        if self.backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+
         # Load model with memory optimization for low-RAM environments
-        self.model = SentenceTransformer(model_name, device='cpu')
+        self.model = self._load_model()
         # Reduce memory footprint
-        self.model.max_seq_length = 256  # Reduce from default 512
+        self.model.max_seq_length = MAX_SEQ_LENGTH
         self.embedding_dim = self.model.get_sentence_embedding_dimension()
 
+        # Document batches are sized by padded token count rather than a fixed
+        # number of texts; the default matches the old worst case of 8 x 256.
+        if token_budget is None:
+            token_budget = int(os.getenv("EMBEDDING_TOKEN_BUDGET", "2048"))
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+
+        # Optional process pool for bulk ingestion; each worker loads its own model
+        # once, and the pool is reused until close()
+        if num_workers is None:
+            num_workers = int(os.getenv("EMBEDDING_WORKERS", "1"))
+        self.num_workers = max(num_workers, 1)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        # Persistent cache so unchanged chunks are never re-encoded.
+        # Backends produce slightly different vectors, so each gets its own key space.
+        if cache_dir is None:
+            cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+        if cache_max_entries is None:
+            cache_max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+        cache_key = model_name if self.backend == "torch" else f"{model_name}:{self.backend}"
+        self.cache = EmbeddingCache(cache_dir, cache_key, cache_max_entries) if cache_dir else None
+
+        # In-process cache for repeated user questions
+        if query_cache_size is None:
+            query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+        if query_cache_ttl is None:
+            query_cache_ttl = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.query_cache = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_ttl, self._tokenizer_lowercases())
+
+        # Optional micro-batching of concurrent queries (useful with threaded workers)
+        if batch_wait_ms is None:
+            batch_wait_ms = float(os.getenv("QUERY_BATCH_WAIT_MS", "0"))
+        if max_query_batch is None:
+            max_query_batch = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+        self.query_batcher = None
+        if batch_wait_ms > 0:
+            self.query_batcher = QueryBatcher(self._encode_queries, batch_wait_ms, max_query_batch)
+
+    def _load_model(self):
+        """Load the encoder for the configured backend."""
+        if self.backend == "onnx":
+            return OnnxEmbeddingBackend(self.model_name)
+
+        # Imported lazily so the ONNX backend never pulls in torch
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name, device='cpu')
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for a list of documents as one float32 array.
+
+        Cached embeddings are reused; only cache misses are sent to the model.
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            C-contiguous float32 array of shape (len(texts), embedding_dim)
+        """
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        cached = self.cache.get_many(texts) if self.cache is not None else {}
+        for i, embedding in cached.items():
+            embeddings[i] = embedding
+
+        missing = [i for i in range(len(texts)) if i not in cached]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.num_workers > 1 and len(missing_texts) > self.max_batch_size:
+                new_embeddings = self._encode_parallel(missing_texts)
+            else:
+                new_embeddings = self._encode_bucketed(missing_texts)
+            embeddings[missing] = new_embeddings
+            if self.cache is not None:
+                self.cache.put_many(missing_texts, new_embeddings)
+
+        return embeddings
+
+    def _tokenizer_lowercases(self) -> bool:
+        """Whether the tokenizer ignores case (as for uncased models such as all-MiniLM-L6-v2)."""
+        sample = ["Policy NDA", "policy nda"]
+        if self.backend == "onnx":
+            encoded = [encoding.ids for encoding in self.model.tokenizer.encode_batch(sample)]
+        else:
+            encoded = self.model.tokenizer(
+                sample, return_attention_mask=False, return_token_type_ids=False
+            )["input_ids"]
+        return encoded[0] == encoded[1]
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """
+        Count tokens per text (capped at max_seq_length) in one batched tokenizer call.
+
+        Args:
+            texts: Texts to measure
+
+        Returns:
+            Integer array of token counts, including special tokens
+        """
+        if self.backend == "onnx":
+            return self.model.token_lengths(texts)
+
+        encoded = self.model.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+    def _length_buckets(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """
+        Group text indices into batches of similar length within the token budget.
+
+        Texts are sorted longest first, so the first text of each batch sets
+        the padded length and the batch grows until padded_length * size
+        would exceed the budget.
+        """
+        order = np.argsort(-lengths, kind="stable")
+        batches = []
+        start = 0
+        while start < len(order):
+            padded_length = max(int(lengths[order[start]]), 1)
+            size = min(max(self.token_budget // padded_length, 1), self.max_batch_size)
+            batches.append(order[start:start + size])
+            start += size
+        return batches
+
+    def _encode_bucketed(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in length-sorted, budget-sized batches, preserving input order."""
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        for batch in self._length_buckets(self.token_lengths(texts)):
+            embeddings[batch] = self.model.encode(
+                [texts[i] for i in batch],
+                show_progress_bar=False,  # Disable progress bar to save memory
+                convert_to_numpy=True,
+                batch_size=len(batch)
+            )
+        return embeddings
+
+    def _worker_pool(self) -> ProcessPoolExecutor:
+        """Start the ingestion worker pool on first use."""
+        with self._pool_lock:
+            if self._pool is None:
+                config = {
+                    "model_name": self.model_name,
+                    "backend": self.backend,
+                    "token_budget": self.token_budget,
+                    "max_batch_size": self.max_batch_size,
+                    "threads": int(os.getenv("OMP_NUM_THREADS", "1") or 1)
+                }
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=multiprocessing.get_context(POOL_START_METHOD),
+                    initializer=_init_embedding_worker,
+                    initargs=(config,)
+                )
+            return self._pool
+
+    def _encode_parallel(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts across the pool of worker processes.
+
+        Texts are split into contiguous shards (a few per worker for load
+        balancing) and results are streamed back in shard order. If a worker
+        fails to load the model, the pool is discarded and BrokenProcessPool
+        is raised.
+        """
+        shard_size = max(-(-len(texts) // (self.num_workers * 4)), 1)
+        starts = range(0, len(texts), shard_size)
+        shards = [texts[start:start + shard_size] for start in starts]
+
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+        try:
+            for start, shard_embeddings in zip(starts, self._worker_pool().map(_embed_shard, shards)):
+                embeddings[start:start + len(shard_embeddings)] = shard_embeddings
+        except BrokenProcessPool:
+            self.close()
+            raise
+
+        return embeddings
+
+    def close(self):
+        """Shut down the ingestion worker pool, if one was started."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for a list of documents.
@@ -35,13 +777,68 @@ class EmbeddingModel:
         Returns:
             List of embedding vectors
         """
-        embeddings = self.model.encode(
-            texts,
-            show_progress_bar=False,  # Disable progress bar to save memory
-            convert_to_numpy=True,
-            batch_size=8  # Smaller batch size for low memory
-        )
-        return embeddings.tolist()
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_query_array(self, query: str) -> np.ndarray:
+        """
+        Generate embedding for a single query as a float32 array.
+
+        Repeated queries are served from the in-process query cache. The
+        returned array is shared with the cache and is read-only.
+
+        Args:
+            query: Query text to embed
+
+        Returns:
+            float32 array of shape (embedding_dim,)
+        """
+        if self.query_cache is not None:
+            embedding = self.query_cache.get(query)
+            if embedding is not None:
+                return embedding
+
+        if self.query_batcher is not None:
+            embedding = self.query_batcher.embed(query)
+        else:
+            embedding = self.model.encode(query, convert_to_numpy=True)
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+
+        if self.query_cache is not None:
+            self.query_cache.put(query, embedding)
+        return embedding
+
+    def embed_queries_array(self, queries: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for several queries in one model call.
+
+        Queries found in the query cache are not re-encoded.
+
+        Args:
+            queries: Query texts to embed
+
+        Returns:
+            float32 array of shape (len(queries), embedding_dim)
+        """
+        embeddings = np.empty((len(queries), self.embedding_dim), dtype=np.float32)
+        missing = []
+        for i, query in enumerate(queries):
+            cached = self.query_cache.get(query) if self.query_cache is not None else None
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+
+        if missing:
+            new_embeddings = self._encode_queries([queries[i] for i in missing])
+            embeddings[missing] = new_embeddings
+            if self.query_cache is not None:
+                for i, embedding in zip(missing, new_embeddings):
+                    embedding = np.array(embedding, dtype=np.float32)
+                    embedding.flags.writeable = False
+                    self.query_cache.put(queries[i], embedding)
+
+        return embeddings
 
     def embed_query(self, query: str) -> List[float]:
         """
@@ -53,8 +850,23 @@ class EmbeddingModel:
         Returns:
             Embedding vector
         """
-        embedding = self.model.encode(query, convert_to_numpy=True)
-        return embedding.tolist()
+        return self.embed_query_array(query).tolist()
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode a micro-batch of queries in a single model call."""
+        return self.model.encode(
+            queries,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            batch_size=len(queries)
+        )
+
+    def get_cache_stats(self) -> Dict:
+        """Get statistics about the embedding caches."""
+        return {
+            "document_cache_entries": len(self.cache) if self.cache is not None else 0,
+            "query_cache": self.query_cache.get_stats() if self.query_cache is not None else None
+        }
 
 
 # Alternative: Cohere embeddings (free tier)
@@ -89,7 +901,7 @@ class CohereEmbedding:
 if __name__ == "__main__":
     # Test embeddings
     embedder = EmbeddingModel()
-    print(f"Using model: {embedder.model_name}")
+    print(f"Using model: {embedder.model_name} ({embedder.backend} backend)")
     print(f"Embedding dimension: {embedder.embedding_dim}")
 
     # Test single query embedding
@@ -311,6 +311,41 @@ Respond with ONLY a number between 0 and 100."""
         }
 
 
+    def evaluate_retrieval(self, questions: List[EvaluationQuestion], k: int = 5) -> Dict:
+        """
+        Evaluate retrieval alone: do the top-k chunks come from the expected documents?
+
+        All questions are retrieved with one batched search, no LLM calls.
+
+        Returns:
+            Dictionary with hit rate and mean recall of relevant document IDs
+        """
+        labeled = [q for q in questions if q.relevant_doc_ids]
+        if not labeled:
+            return {}
+
+        start_time = time.time()
+        batch_results = self.rag_pipeline.vector_store.search_many([q.question for q in labeled], k=k)
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        hits = []
+        recalls = []
+        for question, results in zip(labeled, batch_results):
+            retrieved_ids = {doc.metadata.get('doc_id') for doc, _ in results}
+            relevant_ids = set(question.relevant_doc_ids)
+            found = len(retrieved_ids & relevant_ids)
+            hits.append(found > 0)
+            recalls.append(found / len(relevant_ids))
+
+        return {
+            "k": k,
+            "questions": len(labeled),
+            "hit_rate": float(np.mean(hits)),
+            "mean_recall": float(np.mean(recalls)),
+            "batch_latency_ms": latency_ms
+        }
+
+
 def load_evaluation_dataset() -> List[EvaluationQuestion]:
     """Load evaluation questions."""
     questions = [
@@ -500,6 +535,7 @@ if __name__ == "__main__":
 
     # Print metrics
     metrics = evaluation_output["metrics"]
+    metrics["retrieval"] = evaluator.evaluate_retrieval(questions, k=rag_pipeline.top_k)
     print("\n" + "="*80)
     print("EVALUATION RESULTS")
     print("="*80)
@@ -524,6 +560,12 @@ if __name__ == "__main__":
     print(f"  Mean: {metrics['latency_ms']['mean']:.0f}ms")
     print(f"  Range: {metrics['latency_ms']['min']:.0f}ms - {metrics['latency_ms']['max']:.0f}ms")
 
+    if metrics["retrieval"]:
+        print(f"\nRetrieval (top-{metrics['retrieval']['k']}):")
+        print(f"  Hit Rate: {metrics['retrieval']['hit_rate']:.3f}")
+        print(f"  Mean Recall: {metrics['retrieval']['mean_recall']:.3f}")
+        print(f"  Batch Latency: {metrics['retrieval']['batch_latency_ms']}ms")
+
     if "by_category" in metrics:
         print("\nBy Category:")
         for cat, cat_metrics in metrics["by_category"].items():
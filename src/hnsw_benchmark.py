@@ -0,0 +1,166 @@
+"""
+Recall/latency benchmark for the Chroma HNSW parameters.
+
+Builds a Chroma index for each setting in a parameter grid and reports
+recall@k against exact brute-force search, query latency (p50/p99) and
+index build time, on the policy corpus and on a synthetic corpus.
+
+Usage:
+    python -m src.hnsw_benchmark [--synthetic 100000] [--k 5] [--queries 200]
+
+Pick the chosen setting with the CHROMA_HNSW_* environment variables; they
+apply when a new index is built.
+"""
+
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Dict, Optional
+import numpy as np
+from src.vector_backends import ChromaBackend
+
+
+# (M, construction_ef, search_ef) settings to compare; Chroma's defaults are 16/100/10
+DEFAULT_GRID = [
+    {"M": 16, "construction_ef": 100, "search_ef": 10},
+    {"M": 16, "construction_ef": 100, "search_ef": 50},
+    {"M": 16, "construction_ef": 200, "search_ef": 100},
+    {"M": 32, "construction_ef": 200, "search_ef": 50},
+    {"M": 32, "construction_ef": 400, "search_ef": 200},
+]
+
+
+def synthetic_corpus(
+    n: int,
+    dim: int = 384,
+    n_queries: int = 200,
+    n_clusters: int = 256,
+    seed: int = 0
+):
+    """
+    Generate clustered unit vectors that stand in for chunk embeddings.
+
+    Args:
+        n: Number of corpus vectors
+        dim: Vector dimension
+        n_queries: Number of query vectors (noisy copies of corpus vectors)
+        n_clusters: Number of topic clusters
+        seed: Random seed
+
+    Returns:
+        Tuple of (corpus, queries) float32 arrays
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    corpus = centers[rng.integers(0, n_clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+
+    queries = corpus[rng.integers(0, n, n_queries)] + 0.3 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return corpus, queries
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, batch_size: int = 256) -> np.ndarray:
+    """Brute-force top-k row indices by cosine similarity, shape (n_queries, k)."""
+    corpus = corpus / np.clip(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12, None)
+    queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    k = min(k, len(corpus))
+
+    top = []
+    for start in range(0, len(queries), batch_size):
+        scores = queries[start:start + batch_size] @ corpus.T
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+        top.append(np.take_along_axis(candidates, order, axis=1))
+    return np.concatenate(top)
+
+
+def benchmark_hnsw(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int = 5,
+    grid: Optional[List[Dict[str, int]]] = None
+) -> List[Dict]:
+    """
+    Measure recall@k, query latency and build time for each HNSW setting.
+
+    Args:
+        corpus: Corpus vectors, shape (n, d)
+        queries: Query vectors, shape (q, d)
+        k: Number of neighbours to retrieve
+        grid: HNSW parameter dicts to compare (defaults to DEFAULT_GRID)
+
+    Returns:
+        One result dict per setting
+    """
+    truth = exact_top_k(corpus, queries, k)
+    ids = [str(i) for i in range(len(corpus))]
+    documents = [""] * len(corpus)
+    metadatas = [{"row": i} for i in range(len(corpus))]
+
+    results = []
+    for params in grid or DEFAULT_GRID:
+        directory = tempfile.mkdtemp(prefix="hnsw_benchmark_")
+        try:
+            backend = ChromaBackend(directory, "benchmark", hnsw_params=params)
+
+            start = time.perf_counter()
+            backend.add(ids, corpus, documents, metadatas)
+            build_seconds = time.perf_counter() - start
+
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                hits = backend.query(query[np.newaxis, :], k)[0]
+                latencies.append((time.perf_counter() - start) * 1000)
+                found = {int(doc_id) for doc_id, _, _, _ in hits}
+                recalls.append(len(found.intersection(expected.tolist())) / len(expected))
+
+            results.append({
+                **params,
+                "recall_at_k": float(np.mean(recalls)),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_seconds": build_seconds
+            })
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def print_results(title: str, results: List[Dict], k: int):
+    """Print benchmark results as a table."""
+    print(f"\n{title}")
+    print(f"{'M':>4} {'constr_ef':>10} {'search_ef':>10} {'recall@' + str(k):>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for row in results:
+        print(f"{row['M']:>4} {row['construction_ef']:>10} {row['search_ef']:>10} "
+              f"{row['recall_at_k']:>10.3f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row['build_seconds']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Chroma HNSW parameters")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--synthetic", type=int, default=100000, help="Synthetic corpus size (0 to skip)")
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic queries")
+    args = parser.parse_args()
+
+    from src.document_processor import DocumentProcessor
+    from src.embeddings import EmbeddingModel
+    from src.evaluation import load_evaluation_dataset
+
+    # Policy corpus, queried with the evaluation questions
+    documents = DocumentProcessor(chunk_size=1000, chunk_overlap=200).load_documents("data/policies")
+    embedder = EmbeddingModel()
+    corpus = embedder.embed_documents_array([doc.content for doc in documents])
+    queries = embedder.embed_queries_array([q.question for q in load_evaluation_dataset()])
+    print_results(f"Policy corpus ({len(corpus)} chunks, {len(queries)} queries)",
+                  benchmark_hnsw(corpus, queries, k=args.k), args.k)
+
+    if args.synthetic:
+        corpus, queries = synthetic_corpus(args.synthetic, dim=corpus.shape[1], n_queries=args.queries)
+        print_results(f"Synthetic corpus ({len(corpus)} chunks, {len(queries)} queries)",
+                      benchmark_hnsw(corpus, queries, k=args.k), args.k)
@@ -0,0 +1,240 @@
+"""
+Reduced-dimension and reduced-precision embedding storage.
+
+Embeddings can be projected to fewer dimensions (by truncation or by a PCA
+fitted at index time) and stored as float16. The same projection is applied
+to queries at search time, so the fitted parameters are saved alongside the
+index.
+"""
+
+import os
+from typing import List, Dict, Optional
+import numpy as np
+
+
+PROJECTION_METHODS = ("none", "truncate", "pca")
+STORAGE_DTYPES = ("float32", "float16")
+
+
+class EmbeddingProjection:
+    """Projects embeddings into the storage space used by the vector index."""
+
+    def __init__(self, method: str = "none", dim: Optional[int] = None, dtype: str = "float32"):
+        """
+        Initialize embedding projection.
+
+        Args:
+            method: "none", "truncate" (keep the first ``dim`` components) or
+                    "pca" (project onto the top ``dim`` principal components)
+            dim: Target dimension (ignored for "none")
+            dtype: Storage dtype, "float32" or "float16"
+        """
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        if method != "none" and not dim:
+            raise ValueError(f"Projection method '{method}' requires a target dimension")
+
+        self.method = method
+        self.dim = dim
+        self.dtype = dtype
+        self.mean = None
+        self.components = None
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingProjection":
+        """Create a projection from EMBEDDING_PROJECTION* environment variables."""
+        dim = os.getenv("EMBEDDING_PROJECTION_DIM")
+        return cls(
+            method=os.getenv("EMBEDDING_PROJECTION", "none").lower(),
+            dim=int(dim) if dim else None,
+            dtype=os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+        )
+
+    @property
+    def is_identity(self) -> bool:
+        """Whether the projection leaves embeddings untouched."""
+        return self.method == "none" and self.dtype == "float32"
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether the projection is ready to transform embeddings."""
+        return self.method != "pca" or self.components is not None
+
+    def output_dim(self, input_dim: int) -> int:
+        """Dimension of projected vectors for a given input dimension."""
+        if self.method == "none":
+            return input_dim
+        if self.method == "pca" and self.components is not None:
+            return self.components.shape[0]
+        return min(self.dim, input_dim)
+
+    def fit(self, embeddings: np.ndarray) -> "EmbeddingProjection":
+        """
+        Fit the projection on index-time embeddings (only needed for PCA).
+
+        Args:
+            embeddings: Array of shape (n, input_dim)
+
+        Raises:
+            ValueError: If there are fewer samples than the target dimension,
+                        which would silently yield fewer components
+        """
+        if self.method != "pca":
+            return self
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) < min(self.dim, embeddings.shape[1]):
+            raise ValueError(
+                f"PCA to {self.dim} dimensions needs at least {self.dim} embeddings, got {len(embeddings)}; "
+                f"lower EMBEDDING_PROJECTION_DIM or use EMBEDDING_PROJECTION=truncate"
+            )
+        self.mean = embeddings.mean(axis=0)
+        # Rows of vt are principal directions, ordered by explained variance
+        _, _, vt = np.linalg.svd(embeddings - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.dim], dtype=np.float32)
+        return self
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Project embeddings (1D or 2D) into storage space.
+
+        Projected vectors are re-normalized so cosine similarity stays a dot
+        product, then cast to the storage dtype.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.is_identity:
+            return embeddings
+
+        if self.method == "truncate":
+            projected = embeddings[..., :self.dim]
+        elif self.method == "pca":
+            if self.components is None:
+                raise RuntimeError("PCA projection must be fitted before use")
+            projected = (embeddings - self.mean) @ self.components.T
+        else:
+            projected = embeddings
+
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        projected = projected / np.clip(norms, 1e-12, None)
+        return np.ascontiguousarray(projected, dtype=self.dtype)
+
+    def save(self, path: str):
+        """Save projection settings and fitted parameters to an .npz file."""
+        arrays = {"method": np.array(self.method), "dtype": np.array(self.dtype),
+                  "dim": np.array(self.dim or 0)}
+        if self.components is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        """Load a projection saved with ``save``."""
+        with np.load(path) as data:
+            projection = cls(
+                method=str(data["method"]),
+                dim=int(data["dim"]) or None,
+                dtype=str(data["dtype"])
+            )
+            if "components" in data:
+                projection.mean = data["mean"]
+                projection.components = data["components"]
+        return projection
+
+    def describe(self, input_dim: int) -> Dict:
+        """Summarize the projection and its storage cost per vector."""
+        output_dim = self.output_dim(input_dim)
+        bytes_per_vector = output_dim * np.dtype(self.dtype).itemsize
+        return {
+            "method": self.method,
+            "dimension": output_dim,
+            "dtype": self.dtype,
+            "bytes_per_vector": bytes_per_vector,
+            "compression_ratio": input_dim * 4 / bytes_per_vector
+        }
+
+
+def _top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact top-k indices by dot product (vectors are normalized)."""
+    scores = queries.astype(np.float32) @ corpus.astype(np.float32).T
+    k = min(k, corpus.shape[0])
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def projection_recall_report(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    projections: List[EmbeddingProjection],
+    k: int = 5
+) -> List[Dict]:
+    """
+    Measure what each projection costs in retrieval recall.
+
+    Recall@k is the fraction of the exact full-precision top-k neighbours
+    that each projected index still returns in its own top-k.
+
+    Args:
+        corpus: Full-precision chunk embeddings, shape (n, d)
+        queries: Full-precision query embeddings, shape (q, d)
+        projections: Candidate projections (PCA ones are fitted on ``corpus``)
+        k: Cutoff for recall
+
+    Returns:
+        One dict per projection with its storage stats and recall@k
+        (``None`` for PCA projections with more dimensions than the corpus
+        has vectors, which cannot be fitted)
+    """
+    corpus = np.asarray(corpus, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    exact = _top_k(corpus, queries, k)
+
+    report = []
+    for projection in projections:
+        if projection.method == "pca" and len(corpus) < min(projection.dim, corpus.shape[1]):
+            row = projection.describe(corpus.shape[1])
+            row["recall_at_k"] = None
+            row["k"] = k
+            report.append(row)
+            continue
+
+        projection.fit(corpus)
+        approx = _top_k(projection.transform(corpus), projection.transform(queries), k)
+        recall = np.mean([
+            len(set(exact_row) & set(approx_row)) / len(exact_row)
+            for exact_row, approx_row in zip(exact, approx)
+        ])
+        row = projection.describe(corpus.shape[1])
+        row["recall_at_k"] = float(recall)
+        row["k"] = k
+        report.append(row)
+
+    return report
+
+
+if __name__ == "__main__":
+    # Retrieval-recall report for candidate storage modes on the policy corpus
+    from src.document_processor import DocumentProcessor
+    from src.embeddings import EmbeddingModel
+    from src.evaluation import load_evaluation_dataset
+
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    docs = processor.load_documents("data/policies")
+    embedder = EmbeddingModel()
+
+    corpus = embedder.embed_documents_array([doc.content for doc in docs])
+    questions = [q.question for q in load_evaluation_dataset()]
+    queries = np.stack([embedder.embed_query_array(q) for q in questions])
+
+    candidates = [EmbeddingProjection("none", dtype="float16")]
+    for dim in (256, 192, 128, 96, 64):
+        candidates.append(EmbeddingProjection("truncate", dim, "float16"))
+        candidates.append(EmbeddingProjection("pca", dim, "float16"))
+
+    print(f"Corpus: {len(docs)} chunks, {len(questions)} queries\n")
+    print(f"{'method':<10}{'dim':>6}{'dtype':>9}{'bytes/vec':>11}{'ratio':>8}{'recall@5':>10}")
+    for row in projection_recall_report(corpus, queries, candidates, k=5):
+        recall = "n/a" if row["recall_at_k"] is None else f"{row['recall_at_k']:.3f}"
+        print(f"{row['method']:<10}{row['dimension']:>6}{row['dtype']:>9}"
+              f"{row['bytes_per_vector']:>11}{row['compression_ratio']:>8.1f}{recall:>10}")
@@ -0,0 +1,169 @@
+"""
+Product quantization of embedding vectors.
+
+Each vector is split into ``n_subvectors`` equal slices and every slice is
+replaced by the index of its nearest centroid in a per-slice k-means
+codebook, so a 384-dim float32 vector (1536 bytes) is stored as 48 uint8
+codes. Inner products against a query are approximated with asymmetric
+distance computation: one lookup table of query-slice/centroid products
+per query, summed over the codes of each vector.
+"""
+
+import os
+from typing import Optional
+import numpy as np
+
+
+def kmeans(x: np.ndarray, k: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    Lloyd's k-means.
+
+    Args:
+        x: Points, shape (n, d) with n >= k
+        k: Number of centroids
+        n_iter: Number of iterations
+        seed: Random seed
+
+    Returns:
+        Centroids, shape (k, d)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _nearest(x, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, x)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        if empty.any():
+            # Reseed empty clusters with random points
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for each row of ``x``."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), batch_size):
+        batch = x[start:start + batch_size]
+        distances = centroid_norms[np.newaxis, :] - 2 * batch @ centroids.T
+        assignments[start:start + batch_size] = distances.argmin(axis=1)
+    return assignments
+
+
+class ProductQuantizer:
+    """Product quantizer with uint8 codes and inner-product lookup tables."""
+
+    def __init__(self, n_subvectors: int = 48, n_centroids: int = 256, n_iter: int = 20, seed: int = 0):
+        """
+        Initialize product quantizer.
+
+        Args:
+            n_subvectors: Number of slices (bytes per encoded vector)
+            n_centroids: Centroids per slice (at most 256)
+            n_iter: k-means iterations
+            seed: Random seed for k-means
+        """
+        if not 1 <= n_centroids <= 256:
+            raise ValueError("n_centroids must be between 1 and 256")
+
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        self.dim = None
+        self.codebooks = None  # (n_subvectors, n_centroids, sub_dim)
+        self.n_train = 0
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """Zero-pad vectors to a multiple of n_subvectors and split them, shape (n, m, sub_dim)."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        padding = -self.dim % self.n_subvectors
+        if padding:
+            vectors = np.pad(vectors, ((0, 0), (0, padding)))
+        return vectors.reshape(len(vectors), self.n_subvectors, -1)
+
+    def fit(self, vectors: np.ndarray) -> "ProductQuantizer":
+        """
+        Train one k-means codebook per slice.
+
+        Args:
+            vectors: Training vectors, shape (n, d)
+
+        Returns:
+            self
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.dim = vectors.shape[1]
+        self.n_subvectors = min(self.n_subvectors, self.dim)
+        slices = self._split(vectors)
+
+        k = min(self.n_centroids, len(vectors))
+        self.codebooks = np.stack([
+            kmeans(slices[:, j], k, n_iter=self.n_iter, seed=self.seed + j)
+            for j in range(self.n_subvectors)
+        ])
+        self.n_train = len(vectors)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode vectors as uint8 codes, shape (n, n_subvectors)."""
+        slices = self._split(vectors)
+        codes = np.empty((len(slices), self.n_subvectors), dtype=np.uint8)
+        for j in range(self.n_subvectors):
+            codes[:, j] = _nearest(slices[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstruct approximate vectors from codes, shape (n, d)."""
+        slices = self.codebooks[np.arange(self.n_subvectors), codes]
+        return slices.reshape(len(codes), -1)[:, :self.dim]
+
+    def lookup_tables(self, queries: np.ndarray) -> np.ndarray:
+        """Query-slice/centroid inner products, shape (q, n_subvectors, n_centroids)."""
+        return np.einsum("qmd,mkd->qmk", self._split(queries), self.codebooks)
+
+    def scores(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products of one query (its lookup table) with encoded vectors."""
+        return table[np.arange(self.n_subvectors), codes].sum(axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the codebooks in bytes."""
+        return int(self.codebooks.nbytes) if self.codebooks is not None else 0
+
+    def save(self, path: str, codes: Optional[np.ndarray] = None):
+        """Save the codebooks (and optionally the codes) as .npz, written atomically."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                codebooks=self.codebooks,
+                codes=codes if codes is not None else np.zeros((0, self.n_subvectors), dtype=np.uint8),
+                config=np.array([self.dim, self.n_subvectors, self.n_centroids, self.n_iter, self.seed, self.n_train])
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a quantizer saved with ``save``.
+
+        Returns:
+            Tuple of (ProductQuantizer, codes)
+        """
+        with np.load(path) as data:
+            dim, n_subvectors, n_centroids, n_iter, seed, n_train = (int(v) for v in data["config"])
+            quantizer = cls(n_subvectors, n_centroids, n_iter, seed)
+            quantizer.dim = dim
+            quantizer.n_train = n_train
+            quantizer.codebooks = data["codebooks"]
+            codes = data["codes"]
+        return quantizer, codes
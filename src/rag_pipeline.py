@@ -3,11 +3,13 @@ RAG pipeline for question answering over policy documents.
 """
 
 import os
+from contextlib import nullcontext
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 from openai import OpenAI
 from src.vector_store import VectorStore
 from src.document_processor import Document
+from src.bm25 import reciprocal_rank_fusion
 
 
 @dataclass
@@ -29,7 +31,11 @@ class RAGPipeline:
         model: str = "gpt-3.5-turbo",
         temperature: float = 0.1,
         max_tokens: int = 500,
-        top_k: int = 5
+        top_k: int = 5,
+        hybrid: bool = True,
+        rrf_k: int = 60,
+        candidate_k: Optional[int] = None,
+        index_lock=None
     ):
         """
         Initialize RAG pipeline.
@@ -41,12 +47,22 @@ class RAGPipeline:
             temperature: Temperature for generation
             max_tokens: Maximum tokens in response
             top_k: Number of documents to retrieve
+            hybrid: Fuse BM25 lexical results with dense results
+            rrf_k: Reciprocal-rank fusion constant
+            candidate_k: Candidates taken from each retriever before fusion
+                         (defaults to 4 x top_k, at least 20)
+            index_lock: Optional ReadWriteLock; retrieval holds its read side so
+                        a concurrent reindex is never seen half-applied
         """
         self.vector_store = vector_store
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.top_k = top_k
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        self.candidate_k = candidate_k or max(top_k * 4, 20)
+        self.index_lock = index_lock
 
         # Initialize LLM client - supports OpenRouter, OpenAI, or Groq
         # Check for OpenRouter first, then OpenAI
@@ -88,28 +104,56 @@ When answering:
 - End with citations in the format: [Source: document_name, Doc ID: POL-XXX]
 """
 
-    def retrieve(self, query: str) -> List[Tuple[Document, float]]:
+    def retrieve(self, query: str, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
         """
         Retrieve relevant documents for a query.
 
+        In hybrid mode dense and BM25 candidates are combined with
+        reciprocal-rank fusion; each returned score is still the dense
+        cosine similarity of the chunk.
+
         Args:
             query: User query
+            where: Optional metadata filter restricting retrieval (e.g. to one policy)
 
         Returns:
             List of (Document, similarity_score) tuples
         """
-        return self.vector_store.search(query, k=self.top_k)
+        # All retriever calls see the same index version; the LLM call runs unlocked
+        with self.index_lock.read() if self.index_lock is not None else nullcontext():
+            return self._retrieve(query, where)
+
+    def _retrieve(self, query: str, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """Dense or hybrid retrieval (see ``retrieve``)."""
+        if not self.hybrid:
+            return self.vector_store.search(query, k=self.top_k, where=where)
+
+        dense = self.vector_store.search(query, k=self.candidate_k, where=where)
+        lexical = self.vector_store.keyword_search(query, k=self.candidate_k, where=where)
+
+        candidates = {doc.id: (doc, score) for doc, score in dense}
+        lexical_only = [doc for doc, _ in lexical if doc.id not in candidates]
+        similarities = self.vector_store.similarities(query, [doc.id for doc in lexical_only])
+        for doc in lexical_only:
+            candidates[doc.id] = (doc, similarities.get(doc.id, 0.0))
+
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc, _ in dense], [doc.id for doc, _ in lexical]],
+            k=self.rrf_k
+        )
+        return [candidates[doc_id] for doc_id, _ in fused[:self.top_k]]
 
     def _format_context(self, documents: List[Tuple[Document, float]]) -> str:
         """Format retrieved documents as context for LLM."""
         context_parts = []
 
         for i, (doc, score) in enumerate(documents):
+            pages = self._page_label(doc.metadata)
             context_parts.append(f"""
 Document {i+1}:
-Source: {doc.metadata['source']}
+Source: {doc.metadata['source']}{f" (pages {pages})" if pages else ""}
 Document ID: {doc.metadata['doc_id']}
-Section: {doc.metadata.get('heading', 'N/A')}
+Section: {doc.metadata.get('heading_path') or doc.metadata.get('heading') or 'N/A'}
 Similarity: {score:.3f}
 
 Content:
@@ -126,16 +170,28 @@ Content:
         for doc, score in documents:
             source_key = f"{doc.metadata['doc_id']}:{doc.metadata['source']}"
             if source_key not in seen:
-                sources.append({
+                source = {
                     "doc_id": doc.metadata['doc_id'],
                     "source": doc.metadata['source'],
                     "heading": doc.metadata.get('heading', ''),
                     "similarity": f"{score:.3f}"
-                })
+                }
+                pages = self._page_label(doc.metadata)
+                if pages:
+                    source["pages"] = pages
+                sources.append(source)
                 seen.add(source_key)
 
         return sources
 
+    @staticmethod
+    def _page_label(metadata: Dict) -> str:
+        """Page range of a PDF chunk, e.g. "4" or "4-5" (empty for other formats)."""
+        start, end = metadata.get('page_start'), metadata.get('page_end')
+        if start is None:
+            return ""
+        return str(start) if start == end else f"{start}-{end}"
+
     def _is_policy_related(self, query: str) -> bool:
         """
         Check if query is related to company policies.
@@ -153,21 +209,22 @@ Content:
         query_lower = query.lower()
         return any(keyword in query_lower for keyword in policy_keywords)
 
-    def answer(self, query: str) -> RAGResponse:
+    def answer(self, query: str, where: Optional[Dict] = None) -> RAGResponse:
         """
         Answer a question using RAG.
 
         Args:
             query: User question
+            where: Optional metadata filter restricting retrieval
 
         Returns:
             RAGResponse object
         """
         # Retrieve relevant documents
-        retrieved_docs = self.retrieve(query)
+        retrieved_docs = self.retrieve(query, where=where)
 
         # Check if any relevant documents were found
-        if not retrieved_docs or retrieved_docs[0][1] < 0.3:  # Similarity threshold
+        if not retrieved_docs or max(score for _, score in retrieved_docs) < 0.3:  # Similarity threshold
             return RAGResponse(
                 answer="I can only answer questions about our company policies. This information is not available in the policy documents I have access to.",
                 sources=[],
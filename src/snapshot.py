@@ -0,0 +1,277 @@
+"""
+Read-only, memory-mapped index snapshots for fast cold starts.
+
+A snapshot directory holds:
+- manifest.json: record count, vector dimension and dtype
+- vectors.npy: normalized vectors, opened with ``mmap_mode='r'``
+- records.bin: UTF-8 id, text and metadata JSON of every chunk, back to back
+- offsets.npy: int64 array of shape (n, 4) with the start of each record's
+  id, text and metadata segments and the end of the record
+- id_order.npy: rows sorted by id, for id lookups by binary search
+- fields.json / field_hashes.npy: metadata field names and an int64 array of
+  shape (n_fields, n) with a hash of each record's value, for filtering
+- bm25_*: the lexical index as mapped arrays (see MappedBM25Index)
+
+Opening a snapshot only reads the manifest, field names and BM25 vocabulary
+and maps the files; chunks are decoded when a search touches them, so
+neither startup nor the first query grows with the corpus. Worker processes
+that map the same files share their pages through the OS page cache.
+"""
+
+import os
+import json
+import mmap
+import shutil
+import hashlib
+from typing import List, Dict, Optional
+import numpy as np
+from src.bm25 import BM25Index, MappedBM25Index
+from src.vector_backends import NumpyBackend
+
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.bin"
+OFFSETS_FILE = "offsets.npy"
+ID_ORDER_FILE = "id_order.npy"
+FIELDS_FILE = "fields.json"
+FIELD_HASHES_FILE = "field_hashes.npy"
+SNAPSHOT_VERSION = 2
+
+
+def value_hash(value) -> int:
+    """Stable 64-bit hash of a metadata value (missing and None hash alike)."""
+    if isinstance(value, float) and value.is_integer():
+        # Match dict lookups, where 1 == 1.0
+        value = int(value)
+    encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little", signed=True)
+
+
+def write_snapshot(
+    path: str,
+    ids: List[str],
+    embeddings: np.ndarray,
+    documents: List[str],
+    metadatas: List[Dict],
+    extra_files: Dict[str, str] = None,
+    bm25: Optional[BM25Index] = None
+):
+    """
+    Write a snapshot directory, replacing any existing one atomically.
+
+    Args:
+        path: Snapshot directory
+        ids: Chunk ids
+        embeddings: Vectors in storage space, shape (n, d)
+        documents: Chunk texts
+        metadatas: Chunk metadata dicts
+        extra_files: Files to copy into the snapshot as {name: source path}
+                     (e.g. the projection)
+        bm25: Lexical index over the same chunks, stored as mapped arrays
+    """
+    embeddings = np.asarray(embeddings)
+    dtype = embeddings.dtype if embeddings.dtype == np.float16 else np.dtype(np.float32)
+    vectors = embeddings.astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = (vectors / np.clip(norms, 1e-12, None)).astype(dtype)
+
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, VECTORS_FILE), vectors)
+
+    offsets = np.empty((len(ids), 4), dtype=np.int64)
+    position = 0
+    with open(os.path.join(tmp_path, RECORDS_FILE), 'wb') as f:
+        for i, (doc_id, content, metadata) in enumerate(zip(ids, documents, metadatas)):
+            for j, segment in enumerate((
+                doc_id.encode("utf-8"),
+                content.encode("utf-8"),
+                json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+            )):
+                offsets[i, j] = position
+                f.write(segment)
+                position += len(segment)
+            offsets[i, 3] = position
+    np.save(os.path.join(tmp_path, OFFSETS_FILE), offsets)
+    np.save(os.path.join(tmp_path, ID_ORDER_FILE), np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int64))
+
+    fields = sorted({field for metadata in metadatas for field in metadata})
+    hashes = np.empty((len(fields), len(ids)), dtype=np.int64)
+    for row, metadata in enumerate(metadatas):
+        for i, field in enumerate(fields):
+            hashes[i, row] = value_hash(metadata.get(field))
+    np.save(os.path.join(tmp_path, FIELD_HASHES_FILE), hashes)
+    with open(os.path.join(tmp_path, FIELDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(fields, f)
+
+    if bm25 is not None:
+        MappedBM25Index.write(bm25, tmp_path, ids)
+
+    for name, source in (extra_files or {}).items():
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(tmp_path, name))
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "count": len(ids),
+            "dimension": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "dtype": str(vectors.dtype)
+        }, f)
+
+    # Swap directories; processes that still map the old files keep valid pages
+    if os.path.exists(path):
+        old_path = path.rstrip(os.sep) + ".old"
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, path)
+
+
+class _RecordColumn:
+    """Lazy, read-only sequence view over one field of the snapshot records."""
+
+    def __init__(self, snapshot: "SnapshotBackend", field: int):
+        self.snapshot = snapshot
+        self.field = field
+
+    def __len__(self) -> int:
+        return self.snapshot.count()
+
+    def __getitem__(self, i):
+        return self.snapshot._read(int(i), self.field)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class _IdIndex:
+    """Id to row lookup by binary search over the snapshot's sorted id order."""
+
+    def __init__(self, snapshot: "SnapshotBackend", order: np.ndarray):
+        self.snapshot = snapshot
+        self.order = order
+
+    def get(self, doc_id: str, default=None):
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.snapshot._read(int(self.order[middle]), 0) < doc_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.order):
+            row = int(self.order[low])
+            if self.snapshot._read(row, 0) == doc_id:
+                return row
+        return default
+
+    def __getitem__(self, doc_id: str) -> int:
+        row = self.get(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        return row
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self.get(doc_id) is not None
+
+
+class SnapshotBackend(NumpyBackend):
+    """
+    Read-only exact index backed by a memory-mapped snapshot.
+
+    Search reuses the NumPy backend; filters compare the mapped field hashes
+    and ids, texts and metadata are decoded from the mapped records file only
+    when accessed. Snapshots written before version 2 fall back to building
+    the id map and filter code columns from the records on first use.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path: str):
+        """
+        Open a snapshot directory.
+
+        Args:
+            path: Directory written by ``write_snapshot``
+        """
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No index snapshot found at {path}. Run setup.py to create one.")
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        self.path = path
+        self.dtype = np.dtype(self.manifest["dtype"])
+        self._count = self.manifest["count"]
+        self._columns = {}
+        self._position_map = None
+        self._fields = None
+
+        if self._count:
+            self.matrix = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+            self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode='r')
+            with open(os.path.join(path, RECORDS_FILE), 'rb') as f:
+                self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.manifest.get("version", 1) >= 2:
+                self._position_map = _IdIndex(self, np.load(os.path.join(path, ID_ORDER_FILE), mmap_mode='r'))
+                with open(os.path.join(path, FIELDS_FILE), 'r', encoding='utf-8') as f:
+                    self._fields = {field: i for i, field in enumerate(json.load(f))}
+                self._field_hashes = np.load(os.path.join(path, FIELD_HASHES_FILE), mmap_mode='r')
+        else:
+            self.matrix = None
+
+        self.ids = _RecordColumn(self, 0)
+        self.documents = _RecordColumn(self, 1)
+        self.metadatas = _RecordColumn(self, 2)
+
+    def lexical_index(self) -> Optional[MappedBM25Index]:
+        """The mapped BM25 index stored in the snapshot, if any."""
+        if not MappedBM25Index.exists(self.path):
+            return None
+        return MappedBM25Index(self.path, self.ids)
+
+    def _read(self, i: int, field: int):
+        """Decode one field of record ``i`` from the mapped records file."""
+        start, end = self.offsets[i, field], self.offsets[i, field + 1]
+        value = self._records[start:end].decode("utf-8")
+        return json.loads(value) if field == 2 else value
+
+    @property
+    def _positions(self) -> Dict[str, int]:
+        """Id to row mapping (built on first lookup for version 1 snapshots)."""
+        if self._position_map is None:
+            self._position_map = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        return self._position_map
+
+    def _field_bitmap(self, field: str, value) -> np.ndarray:
+        if self._fields is None:
+            return super()._field_bitmap(field, value)
+        row = self._fields.get(field)
+        if row is None:
+            return np.full(self._count, value is None, dtype=bool)
+        return self._field_hashes[row] == value_hash(value)
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Index snapshots are read-only; rebuild them with setup.py")
+
+    add = upsert = delete = reset = _read_only
+
+    def count(self):
+        return self._count
+
+    def get_stats(self):
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "mapped_bytes": int(self.matrix.nbytes) if self.matrix is not None else 0,
+            "dtype": str(self.dtype)
+        }
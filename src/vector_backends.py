@@ -0,0 +1,775 @@
+"""
+Storage and search backends for the vector store.
+
+VectorStore handles embedding and projection; a backend only stores
+(id, vector, text, metadata) records and answers nearest-neighbour queries
+over already-embedded vectors. Similarities are cosine similarities.
+"""
+
+import os
+import json
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from src.quantization import ProductQuantizer
+
+
+# One search hit: (chunk id, chunk text, chunk metadata, cosine similarity)
+SearchHit = Tuple[str, str, Dict, float]
+
+# Chroma HNSW parameters and the environment variables that set them
+HNSW_PARAMS = {
+    "construction_ef": "CHROMA_HNSW_CONSTRUCTION_EF",
+    "search_ef": "CHROMA_HNSW_SEARCH_EF",
+    "M": "CHROMA_HNSW_M",
+}
+
+FIELD_OPERATORS = ("$eq", "$ne", "$in", "$nin")
+LOGICAL_OPERATORS = ("$and", "$or")
+# Metadata value types that can be compared in a filter
+SCALAR_TYPES = (str, int, float, bool)
+
+
+def normalize_filter(where: Optional[Dict]) -> Optional[Dict]:
+    """
+    Validate a metadata filter and bring it into canonical form.
+
+    Filters use the ChromaDB ``where`` syntax over chunk metadata fields
+    (``doc_id``, ``source``, ``heading``, ...)::
+
+        {"doc_id": "POL-001"}
+        {"source": {"$in": ["pto_policy.md", "holidays_and_leave.md"]}}
+        {"$and": [{"doc_id": "POL-002"}, {"heading": {"$ne": "Overview"}}]}
+
+    Several fields in one dict are combined with ``$and``. Every field
+    condition is rewritten to ``{field: {op: value}}``, and a ``$and``/``$or``
+    with a single filter is replaced by that filter (Chroma requires two).
+
+    Raises:
+        ValueError: If the filter is malformed or uses an unsupported operator
+    """
+    if not where:
+        return None
+    if not isinstance(where, dict):
+        raise ValueError("Filter must be a JSON object")
+
+    clauses = []
+    for key, value in where.items():
+        if key in LOGICAL_OPERATORS:
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"'{key}' expects a non-empty list of filters")
+            items = [normalize_filter(item) for item in value]
+            if any(item is None for item in items):
+                raise ValueError(f"'{key}' expects non-empty filters")
+            clauses.append(items[0] if len(items) == 1 else {key: items})
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator: {key}")
+        else:
+            condition = value if isinstance(value, dict) else {"$eq": value}
+            if len(condition) != 1:
+                raise ValueError(f"Filter on '{key}' must use exactly one operator")
+            op, operand = next(iter(condition.items()))
+            if op not in FIELD_OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if op in ("$in", "$nin"):
+                if not isinstance(operand, list) or not all(isinstance(item, SCALAR_TYPES) for item in operand):
+                    raise ValueError(f"'{op}' expects a list of strings, numbers or booleans")
+            elif not isinstance(operand, SCALAR_TYPES):
+                raise ValueError(f"'{op}' on '{key}' expects a string, number or boolean")
+            clauses.append({key: {op: operand}})
+
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _append_rows(buffer: Optional[np.ndarray], current: Optional[np.ndarray], rows: np.ndarray):
+    """
+    Append rows to an array that lives at the start of a larger buffer.
+
+    The buffer at least doubles when it runs out of room, so appending n rows
+    in batches copies O(n) data in total.
+
+    Returns:
+        (buffer, view of its filled rows)
+    """
+    n = 0 if current is None else len(current)
+    needed = n + len(rows)
+    if buffer is None or current is None or current.base is not buffer or len(buffer) < needed:
+        dtype = rows.dtype if current is None else current.dtype
+        grown = np.empty((max(needed, 2 * n),) + rows.shape[1:], dtype=dtype)
+        if n:
+            grown[:n] = current
+        buffer = grown
+    buffer[n:needed] = rows
+    return buffer, buffer[:needed]
+
+
+def metadata_matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a normalized filter against one chunk's metadata."""
+    if not where:
+        return True
+
+    key, value = next(iter(where.items()))
+    if key == "$and":
+        return all(metadata_matches(metadata, clause) for clause in value)
+    if key == "$or":
+        return any(metadata_matches(metadata, clause) for clause in value)
+
+    op, operand = next(iter(value.items()))
+    field_value = metadata.get(key)
+    if op == "$eq":
+        return field_value == operand
+    if op == "$ne":
+        return field_value != operand
+    if op == "$in":
+        return field_value in operand
+    return field_value not in operand
+
+
+class VectorBackend:
+    """Interface implemented by vector store backends."""
+
+    name = "base"
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        """Store new records."""
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        """Insert new records and overwrite existing ones with the same ids."""
+        raise NotImplementedError
+
+    @contextmanager
+    def bulk_write(self):
+        """
+        Group several writes so the index is persisted once, when the block exits.
+
+        Backends that persist every write themselves (Chroma) ignore this.
+        """
+        yield
+
+    def delete(self, ids: List[str]):
+        """Delete records by id (unknown ids are ignored)."""
+        raise NotImplementedError
+
+    def get_metadata(self, ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Return {id: metadata} for the given ids, or for all records."""
+        raise NotImplementedError
+
+    def get_documents(self, ids: Optional[List[str]] = None) -> Dict[str, Tuple[str, Dict]]:
+        """Return {id: (text, metadata)} for the given ids, or for all records."""
+        raise NotImplementedError
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Return {id: stored vector} for the given ids."""
+        raise NotImplementedError
+
+    def query(self, embeddings: np.ndarray, k: int, where: Optional[Dict] = None) -> List[List[SearchHit]]:
+        """Return the top-k hits for each row of ``embeddings`` among chunks matching ``where``."""
+        raise NotImplementedError
+
+    def filter_ids(self, where: Dict) -> set:
+        """Return the ids of all chunks matching a normalized filter."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of stored records."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Delete all records."""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        """Backend-specific statistics."""
+        return {"backend": self.name}
+
+
+def hnsw_params_from_env() -> Dict[str, int]:
+    """Read the HNSW parameters that are set in the environment."""
+    return {
+        param: int(os.getenv(env_var))
+        for param, env_var in HNSW_PARAMS.items() if os.getenv(env_var)
+    }
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB persistent collection with an HNSW index."""
+
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, collection_name: str, hnsw_params: Optional[Dict[str, int]] = None):
+        """
+        Initialize ChromaDB backend.
+
+        Args:
+            persist_directory: Directory to persist the database
+            collection_name: Name of the collection
+            hnsw_params: HNSW "construction_ef", "search_ef" and "M" used when the
+                         collection is created (defaults to the CHROMA_HNSW_*
+                         environment variables; unset values keep Chroma's defaults)
+        """
+        # Imported lazily so other backends start without chromadb
+        import chromadb
+        from chromadb.config import Settings
+
+        self.collection_name = collection_name
+        self.hnsw_params = hnsw_params_from_env() if hnsw_params is None else dict(hnsw_params)
+        unknown = set(self.hnsw_params) - set(HNSW_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown HNSW parameters: {sorted(unknown)}")
+
+        # Initialize ChromaDB with persistence
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
+            )
+        )
+
+        # Get or create collection
+        self.collection = self._get_or_create_collection()
+
+    def _get_or_create_collection(self):
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={
+                "hnsw:space": "cosine",  # Use cosine similarity
+                **{f"hnsw:{param}": value for param, value in self.hnsw_params.items()}
+            }
+        )
+
+    def add(self, ids, embeddings, documents, metadatas):
+        # Add to collection in batches (ChromaDB has batch size limits);
+        # embeddings are passed as ndarray slices, without a copy to lists
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            self.collection.add(
+                documents=documents[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
+                ids=ids[i:i + batch_size],
+                embeddings=embeddings[i:i + batch_size]
+            )
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            self.collection.upsert(
+                documents=documents[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
+                ids=ids[i:i + batch_size],
+                embeddings=embeddings[i:i + batch_size]
+            )
+
+    def delete(self, ids):
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[i:i + batch_size])
+
+    def get_metadata(self, ids=None):
+        if ids is not None and not ids:
+            return {}
+        results = self.collection.get(ids=ids, include=["metadatas"])
+        return dict(zip(results['ids'], results['metadatas']))
+
+    def get_documents(self, ids=None):
+        if ids is not None and not ids:
+            return {}
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: (content, metadata)
+            for doc_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+
+    def get_embeddings(self, ids):
+        if not ids:
+            return {}
+        results = self.collection.get(ids=ids, include=["embeddings"])
+        return {
+            doc_id: np.asarray(embedding, dtype=np.float32)
+            for doc_id, embedding in zip(results['ids'], results['embeddings'])
+        }
+
+    def query(self, embeddings, k, where=None):
+        # Filters are evaluated inside Chroma's index query
+        results = self.collection.query(
+            query_embeddings=np.asarray(embeddings, dtype=np.float32),
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+
+        # ChromaDB returns cosine distance in cosine space
+        return [
+            [
+                (ids[i], results['documents'][q][i], results['metadatas'][q][i], 1 - results['distances'][q][i])
+                for i in range(len(ids))
+            ]
+            for q, ids in enumerate(results['ids'])
+        ]
+
+    def filter_ids(self, where):
+        return set(self.collection.get(where=where, include=[])['ids'])
+
+    def count(self):
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self._get_or_create_collection()
+
+    def get_stats(self):
+        # Parameters the existing collection was built with
+        metadata = self.collection.metadata or {}
+        return {
+            "backend": self.name,
+            "hnsw": {
+                param: metadata[f"hnsw:{param}"]
+                for param in HNSW_PARAMS if f"hnsw:{param}" in metadata
+            }
+        }
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact in-memory index over a normalized vector matrix.
+
+    Search is one matrix-vector product followed by ``argpartition``, which
+    beats an HNSW index on corpora of a few thousand chunks and has exact
+    recall. The matrix is saved as a single .npy file with a JSON file for
+    ids, texts and metadata.
+    """
+
+    name = "numpy"
+    # np.load mmap_mode for the saved matrix (None loads it into memory)
+    mmap_mode = None
+    # Spare capacity behind ``matrix``, plus bulk_write nesting and unsaved state
+    _buffer = None
+    _bulk_depth = 0
+    _dirty = False
+
+    def __init__(self, persist_directory: str, collection_name: str, dtype: str = "float32"):
+        """
+        Initialize NumPy backend.
+
+        Args:
+            persist_directory: Directory holding the saved index
+            collection_name: Name used for the index files
+            dtype: Storage dtype of the vector matrix ("float32" or "float16")
+        """
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(persist_directory, f"{collection_name}_vectors.npy")
+        self.meta_path = os.path.join(persist_directory, f"{collection_name}_meta.json")
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self.matrix = None
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._positions = {}
+        # Lazily built {field: (int32 value code per row, {value: code})} used for filtering
+        self._columns = {}
+        self._load()
+
+    def _load(self):
+        """Load a previously saved index, if any."""
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.meta_path)):
+            return
+
+        self.matrix = np.load(self.vectors_path, mmap_mode=self.mmap_mode)
+        self.dtype = self.matrix.dtype
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta["metadatas"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    @contextmanager
+    def bulk_write(self):
+        self._bulk_depth += 1
+        try:
+            yield
+        finally:
+            self._bulk_depth -= 1
+            if not self._bulk_depth and self._dirty:
+                self._dirty = False
+                self._save()
+
+    def _persist(self):
+        """Save the index now, or when the enclosing bulk_write block exits."""
+        if self._bulk_depth:
+            self._dirty = True
+        else:
+            self._save()
+
+    def _save(self):
+        """Write the index files atomically."""
+        for path, write in (
+            (self.vectors_path, lambda f: np.save(f, self.matrix)),
+            (self.meta_path, lambda f: f.write(json.dumps({
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas
+            }).encode("utf-8")))
+        ):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+
+    def _normalize(self, embeddings) -> np.ndarray:
+        """Normalize rows and cast them to the storage dtype."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-12, None)).astype(self.dtype)
+
+    def _append(self, ids, embeddings, documents, metadatas):
+        """Append new rows without saving."""
+        self._columns = {}
+        self._buffer, self.matrix = _append_rows(self._buffer, self.matrix, embeddings)
+        for doc_id in ids:
+            self._positions[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+    @staticmethod
+    def _check_unique(ids):
+        """Reject batches that repeat an id (as Chroma does)."""
+        if len(set(ids)) != len(ids):
+            repeated = [doc_id for doc_id, count in Counter(ids).items() if count > 1]
+            raise ValueError(f"IDs repeat within the batch: {repeated[:5]}")
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+
+        self._check_unique(ids)
+        duplicates = [doc_id for doc_id in ids if doc_id in self._positions]
+        if duplicates:
+            raise ValueError(f"IDs already exist in the index: {duplicates[:5]}")
+
+        self._append(list(ids), self._normalize(embeddings), list(documents), list(metadatas))
+        self._persist()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+
+        self._check_unique(ids)
+        embeddings = self._normalize(embeddings)
+        self._columns = {}
+        new_rows = []
+        for row, doc_id in enumerate(ids):
+            position = self._positions.get(doc_id)
+            if position is None:
+                new_rows.append(row)
+            else:
+                self.matrix[position] = embeddings[row]
+                self.documents[position] = documents[row]
+                self.metadatas[position] = metadatas[row]
+
+        if new_rows:
+            self._append(
+                [ids[i] for i in new_rows],
+                embeddings[new_rows],
+                [documents[i] for i in new_rows],
+                [metadatas[i] for i in new_rows]
+            )
+        self._persist()
+
+    def delete(self, ids):
+        remove = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+        if not remove:
+            return
+
+        self._columns = {}
+        keep = [i for i in range(len(self.ids)) if i not in remove]
+        self.matrix = self.matrix[keep]
+        self._buffer = None
+        self.ids = [self.ids[i] for i in keep]
+        self.documents = [self.documents[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._persist()
+
+    def get_metadata(self, ids=None):
+        if ids is None:
+            return dict(zip(self.ids, self.metadatas))
+        return {
+            doc_id: self.metadatas[self._positions[doc_id]]
+            for doc_id in ids if doc_id in self._positions
+        }
+
+    def get_documents(self, ids=None):
+        positions = range(len(self.ids)) if ids is None else [
+            self._positions[doc_id] for doc_id in ids if doc_id in self._positions
+        ]
+        return {self.ids[i]: (self.documents[i], self.metadatas[i]) for i in positions}
+
+    def get_embeddings(self, ids):
+        return {
+            doc_id: self.matrix[self._positions[doc_id]].astype(np.float32)
+            for doc_id in ids if doc_id in self._positions
+        }
+
+    def _field_bitmap(self, field: str, value) -> np.ndarray:
+        """Boolean mask of rows whose metadata ``field`` equals ``value``."""
+        if field not in self._columns:
+            # One code per row keeps memory linear in the rows, however many distinct values there are
+            codes = {}
+            column = np.fromiter(
+                (codes.setdefault(metadata.get(field), len(codes)) for metadata in self.metadatas),
+                dtype=np.int32,
+                count=len(self.metadatas)
+            )
+            self._columns[field] = (column, codes)
+        column, codes = self._columns[field]
+        code = codes.get(value)
+        return column == code if code is not None else np.zeros(len(self.ids), dtype=bool)
+
+    def _filter_mask(self, where: Dict) -> np.ndarray:
+        """Evaluate a normalized filter to a boolean row mask using the field code columns."""
+        key, value = next(iter(where.items()))
+        if key in ("$and", "$or"):
+            masks = [self._filter_mask(clause) for clause in value]
+            return np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+
+        op, operand = next(iter(value.items()))
+        if op in ("$eq", "$ne"):
+            mask = self._field_bitmap(key, operand)
+        else:
+            mask = np.logical_or.reduce(
+                [self._field_bitmap(key, item) for item in operand] or [np.zeros(len(self.ids), dtype=bool)]
+            )
+        return ~mask if op in ("$ne", "$nin") else mask
+
+    def filter_ids(self, where):
+        if not self.ids:
+            return set()
+        return {self.ids[i] for i in np.flatnonzero(self._filter_mask(where))}
+
+    def query(self, embeddings, k, where=None):
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.matrix is None or not self.ids:
+            return [[] for _ in range(len(embeddings))]
+
+        # Restrict scoring to matching rows instead of filtering results afterwards
+        rows = np.flatnonzero(self._filter_mask(where)) if where else None
+        matrix = self.matrix if rows is None else self.matrix[rows]
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.clip(norms, 1e-12, None)
+        scores = embeddings @ matrix.T.astype(np.float32, copy=False)
+
+        k = min(k, scores.shape[1])
+        results = []
+        for row in scores:
+            if k < len(row):
+                top = np.argpartition(-row, k - 1)[:k]
+            else:
+                top = np.arange(len(row))
+            top = top[np.argsort(-row[top], kind="stable")]
+            positions = top if rows is None else rows[top]
+            results.append([
+                (self.ids[i], self.documents[i], self.metadatas[i], float(score))
+                for i, score in zip(positions, row[top])
+            ])
+        return results
+
+    def count(self):
+        return len(self.ids)
+
+    def reset(self):
+        self.matrix = None
+        self._buffer = None
+        self._dirty = False
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._positions = {}
+        self._columns = {}
+        for path in (self.vectors_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get_stats(self):
+        return {
+            "backend": self.name,
+            "index_bytes": int(self.matrix.nbytes) if self.matrix is not None else 0,
+            "dtype": str(self.dtype)
+        }
+
+
+class PQBackend(NumpyBackend):
+    """
+    Product-quantized index for corpora that outgrow full-precision vectors.
+
+    Only uint8 PQ codes and the codebooks are held in memory. Queries rank
+    candidates with lookup tables over the codes and re-rank a shortlist
+    with the exact vectors, which stay on disk and are memory-mapped (inside
+    a ``bulk_write`` block they are held in memory until the block exits).
+    Codebooks are trained on the first vectors added and retrained whenever
+    the index has doubled past its training set (up to ``train_size``).
+    """
+
+    name = "pq"
+    mmap_mode = "r"
+    _codes_buffer = None
+
+    def __init__(
+        self,
+        persist_directory: str,
+        collection_name: str,
+        dtype: str = "float32",
+        subvectors: Optional[int] = None,
+        rerank: Optional[int] = None,
+        train_size: Optional[int] = None
+    ):
+        """
+        Initialize PQ backend.
+
+        Args:
+            persist_directory: Directory holding the saved index
+            collection_name: Name used for the index files
+            dtype: Storage dtype of the exact vectors on disk
+            subvectors: Bytes per encoded vector (or set PQ_SUBVECTORS); applies
+                        when codebooks are trained
+            rerank: Shortlist size re-ranked with exact vectors (or set PQ_RERANK)
+            train_size: Maximum number of vectors used to train the codebooks
+                        (or set PQ_TRAIN_SIZE)
+        """
+        self.subvectors = subvectors or int(os.getenv("PQ_SUBVECTORS", "48"))
+        self.rerank = rerank or int(os.getenv("PQ_RERANK", "100"))
+        self.train_size = train_size or int(os.getenv("PQ_TRAIN_SIZE", "20000"))
+        self.pq_path = os.path.join(persist_directory, f"{collection_name}_pq.npz")
+        self.quantizer = None
+        self.codes = None
+        super().__init__(persist_directory, collection_name, dtype)
+
+    def _load(self):
+        super()._load()
+        if self.matrix is not None and os.path.exists(self.pq_path):
+            self.quantizer, self.codes = ProductQuantizer.load(self.pq_path)
+
+    def _save(self):
+        """Write the index and PQ codes, then re-map the exact vectors from disk."""
+        super()._save()
+        if self.quantizer is not None:
+            self.quantizer.save(self.pq_path, self.codes)
+        self.matrix = np.load(self.vectors_path, mmap_mode=self.mmap_mode)
+        self._buffer = None
+
+    def _update_codes(self, rows: np.ndarray):
+        """Encode changed rows, retraining the codebooks (and re-encoding every row) if needed."""
+        target = min(len(self.ids), self.train_size)
+        if len(self.ids) and (self.quantizer is None or self.quantizer.n_train < target // 2):
+            sample = np.arange(len(self.ids))
+            if len(sample) > target:
+                sample = np.sort(np.random.default_rng(0).choice(len(sample), target, replace=False))
+            self.quantizer = ProductQuantizer(self.subvectors).fit(self.matrix[sample])
+            rows = np.arange(len(self.ids))
+            self.codes = self._codes_buffer = None
+
+        if self.quantizer is not None:
+            missing = len(self.ids) - (0 if self.codes is None else len(self.codes))
+            if missing > 0:
+                self._codes_buffer, self.codes = _append_rows(
+                    self._codes_buffer,
+                    self.codes,
+                    np.zeros((missing, self.quantizer.n_subvectors), dtype=np.uint8)
+                )
+            for start in range(0, len(rows), 8192):
+                batch = rows[start:start + 8192]
+                self.codes[batch] = self.quantizer.encode(self.matrix[batch])
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        start = len(self.ids)
+        with self.bulk_write():
+            super().add(ids, embeddings, documents, metadatas)
+            self._update_codes(np.arange(start, len(self.ids)))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        existing = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+        start = len(self.ids)
+        if self.matrix is not None and not self.matrix.flags.writeable:
+            self.matrix = np.array(self.matrix)  # writable copy of the mapped vectors
+        with self.bulk_write():
+            super().upsert(ids, embeddings, documents, metadatas)
+            self._update_codes(np.concatenate([np.array(existing, dtype=np.int64), np.arange(start, len(self.ids))]))
+
+    def delete(self, ids):
+        remove = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+        if not remove:
+            return
+        with self.bulk_write():
+            super().delete(ids)
+            if self.codes is not None:
+                self.codes = np.delete(self.codes, remove, axis=0)
+            self._update_codes(np.array([], dtype=np.int64))
+
+    def query(self, embeddings, k, where=None):
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.codes is None or not self.ids:
+            return [[] for _ in range(len(embeddings))]
+
+        rows = np.flatnonzero(self._filter_mask(where)) if where else np.arange(len(self.ids))
+        codes = self.codes[rows]
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.clip(norms, 1e-12, None)
+        tables = self.quantizer.lookup_tables(embeddings)
+
+        results = []
+        for query, table in zip(embeddings, tables):
+            approx = self.quantizer.scores(table, codes)
+            size = min(max(k, self.rerank), len(approx))
+            shortlist = np.argpartition(-approx, size - 1)[:size] if size < len(approx) else np.arange(len(approx))
+
+            # Exact re-rank; sorted positions keep reads from the mapped file sequential
+            positions = np.sort(rows[shortlist])
+            exact = self.matrix[positions].astype(np.float32) @ query
+            top = np.argsort(-exact, kind="stable")[:k]
+            results.append([
+                (self.ids[i], self.documents[i], self.metadatas[i], float(score))
+                for i, score in zip(positions[top], exact[top])
+            ])
+        return results
+
+    def reset(self):
+        super().reset()
+        self.quantizer = None
+        self.codes = None
+        self._codes_buffer = None
+        if os.path.exists(self.pq_path):
+            os.remove(self.pq_path)
+
+    def get_stats(self):
+        stats = {"backend": self.name, "dtype": str(self.dtype), "rerank": self.rerank}
+        if self.codes is None or self.matrix is None:
+            return stats
+
+        full_bytes = len(self.ids) * self.matrix.shape[1] * np.dtype(np.float32).itemsize
+        memory_bytes = int(self.codes.nbytes) + self.quantizer.nbytes
+        stats.update({
+            "subvectors": self.quantizer.n_subvectors,
+            "bytes_per_vector": self.quantizer.n_subvectors,
+            "memory_bytes": memory_bytes,
+            "full_precision_bytes": full_bytes,
+            "compression_ratio": full_bytes / memory_bytes if memory_bytes else None,
+            "mapped_bytes": int(self.matrix.nbytes)
+        })
+        return stats
+
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend,
+    "pq": PQBackend,
+}
@@ -1,133 +1,535 @@
 """
-Vector store using ChromaDB for document retrieval.
+Vector store for document retrieval.
+
+Storage and nearest-neighbour search are delegated to a pluggable backend
+(see src/vector_backends.py): ChromaDB by default, an exact in-memory
+NumPy index for small corpora, a product-quantized index for large ones,
+or a read-only memory-mapped snapshot
+(see src/snapshot.py) for fast cold starts.
 """
 
 import os
-from typing import List, Dict, Tuple
-import chromadb
-from chromadb.config import Settings
+import queue
+import threading
+from typing import List, Dict, Tuple, Optional, Iterable
+import numpy as np
 from src.document_processor import Document
-from src.embeddings import EmbeddingModel
+from src.embeddings import EmbeddingModel, EmbeddingCache
+from src.projection import EmbeddingProjection
+from src.bm25 import BM25Index
+from src.vector_backends import BACKENDS, VectorBackend, normalize_filter
+from src.snapshot import SnapshotBackend, write_snapshot
 
 
 class VectorStore:
     """Vector store for document embeddings and retrieval."""
 
-    def __init__(self, persist_directory: str = "chroma_db", collection_name: str = "policies"):
+    def __init__(
+        self,
+        persist_directory: str = "chroma_db",
+        collection_name: str = "policies",
+        projection: Optional[EmbeddingProjection] = None,
+        backend: Optional[str] = None
+    ):
         """
         Initialize vector store.
 
         Args:
             persist_directory: Directory to persist the database
             collection_name: Name of the collection
+            projection: Storage projection for new indexes (defaults to the
+                        EMBEDDING_PROJECTION* environment variables). An index
+                        that already exists keeps the projection it was built with.
+            backend: "chroma", "numpy", "pq" or "snapshot" (or set VECTOR_BACKEND);
+                     "snapshot" opens ``persist_directory`` as a read-only
+                     snapshot written by ``write_snapshot``
         """
         self.persist_directory = persist_directory
         self.collection_name = collection_name
-
-        # Initialize ChromaDB with persistence
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
-        )
+        self.backend_name = (backend or os.getenv("VECTOR_BACKEND", "chroma")).lower()
+        if self.backend_name not in BACKENDS and self.backend_name != SnapshotBackend.name:
+            raise ValueError(f"Unknown vector backend: {self.backend_name}")
+
+        # Projection applied to stored vectors and to queries
+        self._projection_config = projection
+        self.projection_path = os.path.join(persist_directory, f"{collection_name}_projection.npz")
+        if os.path.exists(self.projection_path):
+            self.projection = EmbeddingProjection.load(self.projection_path)
+        else:
+            self.projection = self._new_projection()
+
+        self.backend = self._create_backend()
+        if not os.path.exists(self.projection_path) and self.backend.count() > 0:
+            # Index was built before a projection was configured
+            self.projection = EmbeddingProjection()
+
+        # Lexical index over the same chunks, persisted next to the vector index
+        # and loaded on first use so startup cost does not grow with the corpus;
+        # snapshots map theirs at open, so the first query parses nothing
+        self.bm25_path = os.path.join(persist_directory, f"{collection_name}_bm25.json")
+        self._bm25 = None
+        if self.backend_name == SnapshotBackend.name:
+            self._bm25 = self.backend.lexical_index()
 
         # Initialize embedding model
         self.embedder = EmbeddingModel()
 
+    @property
+    def bm25(self) -> BM25Index:
+        """Lexical index, loaded (or rebuilt for older indexes) on first use."""
+        if self._bm25 is None:
+            if os.path.exists(self.bm25_path):
+                self._bm25 = BM25Index.load(self.bm25_path)
+            else:
+                self._bm25 = BM25Index()
+                if self.backend.count() > 0:
+                    # Index was built before lexical search existed
+                    stored = self.backend.get_documents()
+                    self._bm25.add(stored.keys(), (content for content, _ in stored.values()))
+                    if self.backend_name != SnapshotBackend.name:
+                        self._save_bm25()
+        return self._bm25
+
+    def _save_bm25(self):
+        """Persist the lexical index."""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self.bm25.save(self.bm25_path)
+
+    def _new_projection(self) -> EmbeddingProjection:
+        """Create an unfitted projection for a new index."""
+        config = self._projection_config
+        if config is None:
+            return EmbeddingProjection.from_env()
+        return EmbeddingProjection(config.method, config.dim, config.dtype)
+
+    def _create_backend(self) -> VectorBackend:
+        """Create the configured storage backend."""
+        if self.backend_name == SnapshotBackend.name:
+            return SnapshotBackend(self.persist_directory)
+        if self.backend_name in ("numpy", "pq"):
+            return BACKENDS[self.backend_name](self.persist_directory, self.collection_name, dtype=self.projection.dtype)
+        return BACKENDS[self.backend_name](self.persist_directory, self.collection_name)
+
     def add_documents(self, documents: List[Document]):
         """
         Add documents to the vector store.
 
         Args:
-            documents: List of Document objects to add
+            documents: List of Document objects (or a DocumentBatch) to add
         """
         if not documents:
             return
 
-        # Extract texts and metadata
-        texts = [doc.content for doc in documents]
-        metadatas = [doc.metadata for doc in documents]
-        ids = [doc.id for doc in documents]
+        # Extract texts and metadata in one pass (a DocumentBatch builds each Document once)
+        texts, metadatas, ids = [], [], []
+        for doc in documents:
+            texts.append(doc.content)
+            metadatas.append(self._stored_metadata(doc))
+            ids.append(doc.id)
 
-        # Generate embeddings
+        # Generate embeddings; an unfitted PCA projection is fitted on this corpus
         print(f"Generating embeddings for {len(texts)} documents...")
-        embeddings = self.embedder.embed_documents(texts)
-
-        # Add to collection in batches (ChromaDB has batch size limits)
-        batch_size = 100
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            batch_metadatas = metadatas[i:i + batch_size]
-            batch_ids = ids[i:i + batch_size]
-            batch_embeddings = embeddings[i:i + batch_size]
-
-            self.collection.add(
-                documents=batch_texts,
-                metadatas=batch_metadatas,
-                ids=batch_ids,
-                embeddings=batch_embeddings
-            )
+        embeddings = self.embedder.embed_documents_array(texts)
+        if not self.projection.is_fitted:
+            self._fit_projection(embeddings)
+        embeddings = self._project_documents(embeddings)
+
+        self.backend.add(ids, embeddings, texts, metadatas)
+        self.bm25.add(ids, texts)
+        self._save_bm25()
 
         print(f"Added {len(texts)} documents to vector store")
 
-    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+    def add_documents_stream(
+        self,
+        documents: Iterable[Document],
+        batch_size: Optional[int] = None,
+        prefetch: int = 2
+    ) -> int:
+        """
+        Add documents from an iterable in bounded batches.
+
+        A producer thread pulls chunks from ``documents`` (e.g.
+        ``DocumentProcessor.iter_documents``) into batches while this thread
+        embeds and writes the previous ones. The queue between them holds at
+        most ``prefetch`` batches, so a slow embedder pauses chunking and peak
+        memory does not grow with the corpus. A PCA projection must already
+        be fitted (see ``fit_projection``). Batches are written inside
+        ``backend.bulk_write()``, so file-backed indexes are persisted once,
+        after the last batch.
+
+        Args:
+            documents: Iterable of Document objects
+            batch_size: Chunks per batch (or set INGEST_BATCH_SIZE)
+            prefetch: Batches the producer may prepare ahead of the writer
+
+        Returns:
+            Number of chunks added
+        """
+        self._require_fitted_projection()
+        batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", "256"))
+        batches = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            # Block while the queue is full, unless the writer has stopped
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            iterator = iter(documents)
+            try:
+                batch = []
+                for doc in iterator:
+                    batch.append(doc)
+                    if len(batch) >= batch_size:
+                        if not put(batch):
+                            return
+                        batch = []
+                if batch and not put(batch):
+                    return
+                put(done)
+            except Exception as e:
+                put(e)
+            finally:
+                # Release a generator's resources (e.g. a worker pool) if the writer stopped early
+                if hasattr(iterator, "close"):
+                    iterator.close()
+
+        producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+        producer.start()
+
+        total = 0
+        try:
+            with self.backend.bulk_write():
+                while True:
+                    batch = batches.get()
+                    if batch is done:
+                        break
+                    if isinstance(batch, Exception):
+                        raise batch
+
+                    texts = [doc.content for doc in batch]
+                    ids = [doc.id for doc in batch]
+                    embeddings = self._project_documents(self.embedder.embed_documents_array(texts))
+                    self.backend.add(ids, embeddings, texts, [self._stored_metadata(doc) for doc in batch])
+                    self.bm25.add(ids, texts)
+                    total += len(batch)
+                    print(f"Added {total} documents to vector store...")
+        finally:
+            stop.set()
+            producer.join()
+            if total:
+                self._save_bm25()
+
+        return total
+
+    def sync_documents(
+        self,
+        documents: List[Document],
+        sources: Optional[Iterable[str]] = None,
+        full: bool = False
+    ) -> Dict[str, int]:
+        """
+        Idempotently bring the index in line with a set of documents.
+
+        Chunks are matched by ``Document.id`` and compared by content hash.
+        Only new or changed chunks are embedded and written. Stored chunks
+        that are no longer produced are deleted if they belong to one of the
+        synced source files.
+
+        Args:
+            documents: Current chunks for the synced source files
+            sources: Source files (``metadata['file_path']``) these documents
+                     fully describe; defaults to the files present in
+                     ``documents``. Include a file with no documents to remove
+                     it entirely. Files are matched by path, so same-named
+                     files in other folders are never touched.
+            full: Treat ``documents`` as the whole corpus and remove every
+                  other stored chunk (an unfitted PCA projection is then
+                  fitted on them; otherwise it must already be fitted)
+
+        Returns:
+            Counts of added, updated, removed and unchanged chunks
+        """
+        # Last occurrence wins if a chunk id repeats
+        incoming = {doc.id: doc for doc in documents}
+        scope = set(sources) if sources is not None else set()
+        scope.update(doc.metadata.get('file_path', '') for doc in incoming.values())
+
+        # Only the synced files' chunks are read, found through the metadata filter index
+        if full:
+            candidates = set(self.backend.get_metadata())
+        elif scope:
+            candidates = self.backend.filter_ids(normalize_filter({"file_path": {"$in": sorted(scope)}}))
+        else:
+            candidates = set()
+        stored = self.backend.get_metadata(list(candidates.union(incoming)))
+
+        added, updated, unchanged = [], [], 0
+        for doc_id, doc in incoming.items():
+            existing = stored.get(doc_id)
+            if existing is None:
+                added.append(doc)
+            elif existing.get('content_hash') != EmbeddingCache.hash_text(doc.content):
+                updated.append(doc)
+            else:
+                unchanged += 1
+
+        removed = [doc_id for doc_id in candidates if doc_id not in incoming]
+
+        changed = added + updated
+        if changed:
+            print(f"Generating embeddings for {len(changed)} new or changed documents...")
+            embeddings = self.embedder.embed_documents_array([doc.content for doc in changed])
+            if full and not self.projection.is_fitted:
+                self._fit_projection(embeddings)
+            embeddings = self._project_documents(embeddings)
+        with self.backend.bulk_write():
+            if changed:
+                self.backend.upsert(
+                    [doc.id for doc in changed],
+                    embeddings,
+                    [doc.content for doc in changed],
+                    [self._stored_metadata(doc) for doc in changed]
+                )
+            if removed:
+                self.backend.delete(removed)
+
+        if changed or removed:
+            self.bm25.add([doc.id for doc in changed], [doc.content for doc in changed])
+            self.bm25.remove(removed)
+            self._save_bm25()
+
+        return {
+            "added": len(added),
+            "updated": len(updated),
+            "removed": len(removed),
+            "unchanged": unchanged
+        }
+
+    def _stored_metadata(self, doc: Document) -> Dict:
+        """Chunk metadata as stored in the index, including its content hash."""
+        return {**doc.metadata, "content_hash": EmbeddingCache.hash_text(doc.content)}
+
+    def fit_projection(self, documents: Iterable[Document], sample_size: Optional[int] = None):
+        """
+        Fit a PCA storage projection on a uniform sample of the whole corpus.
+
+        Streamed and incremental indexing only see part of the corpus at a
+        time, so they need the projection fitted beforehand. ``documents`` is
+        read once and reservoir-sampled, so memory stays bounded. Does nothing
+        if the projection is already fitted or needs no fitting.
+
+        Args:
+            documents: Every chunk of the corpus (e.g. ``DocumentProcessor.iter_documents``)
+            sample_size: Chunks embedded for the fit (or set EMBEDDING_PROJECTION_SAMPLE)
+        """
+        if self.projection.is_fitted:
+            return
+
+        sample_size = sample_size or int(os.getenv("EMBEDDING_PROJECTION_SAMPLE", "4096"))
+        rng = np.random.default_rng(0)
+        sample = []
+        for seen, doc in enumerate(documents):
+            if len(sample) < sample_size:
+                sample.append(doc.content)
+            else:
+                slot = rng.integers(0, seen + 1)
+                if slot < sample_size:
+                    sample[slot] = doc.content
+
+        print(f"Fitting {self.projection.method} projection on {len(sample)} sampled chunks...")
+        self._fit_projection(self.embedder.embed_documents_array(sample))
+
+    def _fit_projection(self, embeddings: np.ndarray):
+        """Fit the projection on corpus embeddings and save it with the index."""
+        self.projection.fit(embeddings)
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self.projection.save(self.projection_path)
+
+    def _require_fitted_projection(self):
+        """Refuse to index with a projection fitted on only part of the corpus."""
+        if not self.projection.is_fitted:
+            raise RuntimeError(
+                "The PCA projection is not fitted; call fit_projection() with the whole corpus before indexing"
+            )
+
+    def _project_documents(self, embeddings: np.ndarray) -> np.ndarray:
+        """Apply the storage projection to document embeddings."""
+        if self.projection.is_identity:
+            return embeddings
+
+        self._require_fitted_projection()
+        if not os.path.exists(self.projection_path):
+            self.projection.save(self.projection_path)
+
+        return self.projection.transform(embeddings)
+
+    def search(self, query: str, k: int = 5, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
         """
         Search for similar documents.
 
         Args:
             query: Query text
             k: Number of results to return
+            where: Optional metadata filter, e.g. {"doc_id": "POL-001"}; it is
+                   applied inside the index query (see normalize_filter)
 
         Returns:
             List of (Document, similarity_score) tuples
         """
         # Generate query embedding
-        query_embedding = self.embedder.embed_query(query)
+        query_embedding = self.projection.transform(self.embedder.embed_query_array(query))
 
-        # Search collection
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k,
-            include=["documents", "metadatas", "distances"]
-        )
+        # Search backend
+        hits = self.backend.query(query_embedding[np.newaxis, :], k, where=normalize_filter(where))[0]
+
+        return self._to_documents(hits)
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        where: Optional[Dict] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Search for several queries at once.
+
+        All queries are embedded in one batch and sent to the index as a
+        single vectorized query.
+
+        Args:
+            queries: Query texts
+            k: Number of results to return per query
+            where: Optional metadata filter applied to every query
+
+        Returns:
+            One list of (Document, similarity_score) tuples per query
+        """
+        where = normalize_filter(where)
+        if not queries:
+            return []
+
+        query_embeddings = self.projection.transform(self.embedder.embed_queries_array(queries))
+        return [self._to_documents(hits) for hits in self.backend.query(query_embeddings, k, where=where)]
+
+    def keyword_search(self, query: str, k: int = 5, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """
+        Search with the BM25 lexical index.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            where: Optional metadata filter; only matching chunks are scored
+
+        Returns:
+            List of (Document, bm25_score) tuples
+        """
+        where = normalize_filter(where)
+        allowed_ids = self.backend.filter_ids(where) if where else None
+        scored = self.bm25.search(query, k=k, allowed_ids=allowed_ids)
+        stored = self.backend.get_documents([doc_id for doc_id, _ in scored])
+        return [
+            (Document(content=stored[doc_id][0], metadata=stored[doc_id][1], id=doc_id), score)
+            for doc_id, score in scored if doc_id in stored
+        ]
+
+    def similarities(self, query: str, ids: List[str]) -> Dict[str, float]:
+        """
+        Cosine similarity between a query and specific stored chunks.
+
+        Args:
+            query: Query text
+            ids: Chunk ids to score
 
-        # Convert results to Document objects
+        Returns:
+            Mapping of chunk id to similarity (ids not in the index are omitted)
+        """
+        if not ids:
+            return {}
+
+        query_embedding = self.projection.transform(self.embedder.embed_query_array(query)).astype(np.float32)
+        query_embedding /= max(np.linalg.norm(query_embedding), 1e-12)
+        similarities = {}
+        for doc_id, embedding in self.backend.get_embeddings(ids).items():
+            similarities[doc_id] = float(query_embedding @ embedding / max(np.linalg.norm(embedding), 1e-12))
+        return similarities
+
+    def _to_documents(self, hits) -> List[Tuple[Document, float]]:
+        """Convert backend hits to (Document, similarity_score) tuples."""
         documents = []
-        for i in range(len(results['documents'][0])):
-            doc = Document(
-                content=results['documents'][0][i],
-                metadata=results['metadatas'][0][i]
-            )
-            # Convert distance to similarity score (cosine distance to similarity)
-            # ChromaDB returns squared L2 distance for cosine space
-            similarity = 1 - results['distances'][0][i]
+        for doc_id, content, metadata, similarity in hits:
+            doc = Document(content=content, metadata=metadata, id=doc_id)
             documents.append((doc, similarity))
-
         return documents
 
     def reset(self):
         """Reset the vector store (delete all documents)."""
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
+        self.backend.reset()
+
+        # A fresh index may use a different projection
+        if os.path.exists(self.projection_path):
+            os.remove(self.projection_path)
+        self.projection = self._new_projection()
+        if self.backend_name in ("numpy", "pq"):
+            self.backend = self._create_backend()
+
+        self._bm25 = BM25Index()
+        if os.path.exists(self.bm25_path):
+            os.remove(self.bm25_path)
+
+    def write_snapshot(self, path: str):
+        """
+        Write the current index as a read-only, memory-mapped snapshot.
+
+        The projection file is copied into the snapshot and the BM25 index is
+        stored as mapped arrays, so
+        ``VectorStore(persist_directory=path, backend="snapshot")`` serves the
+        same dense, lexical and filtered searches as this store.
+
+        Args:
+            path: Snapshot directory (replaced atomically if it exists)
+        """
+        stored = self.backend.get_documents()
+        ids = list(stored)
+        embeddings = self.backend.get_embeddings(ids)
+        dim = self.projection.output_dim(self.embedder.embedding_dim)
+        matrix = np.zeros((len(ids), dim), dtype=self.projection.dtype)
+        for row, doc_id in enumerate(ids):
+            matrix[row] = embeddings[doc_id]
+
+        write_snapshot(
+            path,
+            ids,
+            matrix,
+            [stored[doc_id][0] for doc_id in ids],
+            [stored[doc_id][1] for doc_id in ids],
+            extra_files={os.path.basename(self.projection_path): self.projection_path},
+            bm25=self.bm25
         )
 
     def get_stats(self) -> Dict:
         """Get statistics about the vector store."""
-        count = self.collection.count()
+        count = self.backend.count()
         return {
             "total_documents": count,
+            "backend": self.backend.get_stats(),
             "collection_name": self.collection_name,
-            "embedding_dimension": self.embedder.embedding_dim
+            "embedding_dimension": self.projection.output_dim(self.embedder.embedding_dim),
+            "model_embedding_dimension": self.embedder.embedding_dim,
+            "storage": self.projection.describe(self.embedder.embedding_dim),
+            "embedding_cache": self.embedder.get_cache_stats(),
+            "query_batching": (
+                self.embedder.query_batcher.get_stats()
+                if self.embedder.query_batcher is not None else None
+            )
         }
 
 
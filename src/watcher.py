@@ -0,0 +1,251 @@
+"""
+Hot reindexing of the policy directory while the app is serving.
+
+A polling thread compares file sizes and modification times under the
+policy directory. Once changes have been quiet for a debounce period, only
+the changed files are re-processed (via the ingestion manifest) and synced
+into the live vector store under the write side of a readers-writer lock.
+Requests hold the read side, so they never see a half-applied update.
+
+The readers-writer lock only covers threads of one process, and other
+processes would keep serving their stale in-memory indexes. The watcher
+therefore only runs in a single-process deployment (one gunicorn worker):
+it refuses to start when WEB_CONCURRENCY is above 1 or when another process
+already watches the same index.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.dedup import Deduplicator
+from src.document_processor import DocumentProcessor
+from src.vector_store import VectorStore
+
+try:
+    import fcntl
+except ImportError:  # Windows; only the WEB_CONCURRENCY check applies
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReadWriteLock:
+    """
+    Lock that admits many readers or a single writer.
+
+    Writers take priority, so a steady stream of requests cannot starve an
+    index update. The lock is not reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class PolicyWatcher:
+    """Background poller that applies policy file changes to a live vector store."""
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        processor: DocumentProcessor,
+        lock: ReadWriteLock,
+        directory: str = "data/policies",
+        interval: Optional[float] = None,
+        debounce: Optional[float] = None,
+        manifest_path: Optional[str] = None,
+        lock_path: Optional[str] = None
+    ):
+        """
+        Initialize policy watcher.
+
+        Args:
+            vector_store: Store to update; must be writable (not a snapshot)
+            processor: Document processor with the settings the index was built with
+            lock: Lock whose read side guards queries against this store
+            directory: Directory to watch
+            interval: Seconds between polls (or set POLICY_WATCH_INTERVAL)
+            debounce: Seconds without further changes before reindexing
+                      (or set POLICY_WATCH_DEBOUNCE)
+            manifest_path: Ingestion manifest (defaults to the processor's)
+            lock_path: File locked while watching, so only one process watches
+                       the index (defaults to policy_watcher.lock in the index directory)
+        """
+        self.vector_store = vector_store
+        self.processor = processor
+        self.lock = lock
+        self.directory = directory
+        self.interval = interval if interval is not None else float(os.getenv("POLICY_WATCH_INTERVAL", "2"))
+        self.debounce = debounce if debounce is not None else float(os.getenv("POLICY_WATCH_DEBOUNCE", "1"))
+        self.manifest_path = manifest_path
+        self.lock_path = lock_path or os.path.join(vector_store.persist_directory, "policy_watcher.lock")
+        self.deduplicator = Deduplicator()
+        self._lock_file = None
+
+        self._state = self._scan()
+        self._last_change: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Size and modification time of every supported file."""
+        state = {}
+        for path in self.processor._list_files(self.directory):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            state[path.as_posix()] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def poll(self) -> bool:
+        """
+        Check the directory once and reindex if changes have settled.
+
+        Returns:
+            True if the index was updated
+        """
+        state = self._scan()
+        now = time.monotonic()
+        if state != self._state:
+            # Keep waiting while files are still being written
+            self._state = state
+            self._last_change = now
+            return False
+
+        if self._last_change is None or now - self._last_change < self.debounce:
+            return False
+        self._last_change = None
+        return self.reindex()
+
+    def reindex(self) -> bool:
+        """
+        Apply changed files to the vector store.
+
+        Returns:
+            True if any file was added, modified or deleted
+        """
+        changes = self.processor.load_changed_documents(self.directory, self.manifest_path)
+        for path, error in self.processor.load_errors.items():
+            logger.warning("Error loading %s: %s", path, error)
+        if not changes.has_changes:
+            return False
+
+        documents = changes.documents
+        if self.deduplicator.enabled:
+            documents = self.deduplicator.deduplicate(documents).documents
+
+        # Embed before taking the lock; the sync then reads from the embedding cache
+        if getattr(self.vector_store.embedder, "cache", None) is not None:
+            self.vector_store.embedder.embed_documents_array([doc.content for doc in documents])
+
+        # First files added to an empty PCA index: fit on the whole directory
+        self.vector_store.fit_projection(self.processor.iter_documents(self.directory))
+
+        with self.lock.write():
+            synced = self.vector_store.sync_documents(documents, sources=changes.sources)
+        self.processor.save_manifest(changes, self.manifest_path)
+
+        logger.info(
+            "Reindexed %d new, %d modified and %d deleted policy files (added: %d, updated: %d, removed: %d)",
+            len(changes.added), len(changes.modified), len(changes.deleted),
+            synced['added'], synced['updated'], synced['removed']
+        )
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # Keep watching; the next change retries the update
+                logger.exception("Policy reindex failed")
+
+    def _acquire_process_lock(self) -> bool:
+        """Take the watcher lock file without blocking; False if another process holds it."""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_process_lock(self):
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def start(self) -> bool:
+        """
+        Start polling in a daemon thread.
+
+        Returns:
+            False if the watcher was not started because the app runs more
+            than one worker process (WEB_CONCURRENCY > 1) or another process
+            already watches this index
+        """
+        if self._thread is not None:
+            return True
+        if int(os.getenv("WEB_CONCURRENCY", "1") or 1) > 1:
+            logger.warning("POLICY_WATCH needs a single worker process (WEB_CONCURRENCY > 1); not watching")
+            return False
+        if not self._acquire_process_lock():
+            logger.warning("Another process is already watching %s (%s); not watching", self.directory, self.lock_path)
+            return False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="policy-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for policy changes every %gs", Path(self.directory), self.interval)
+        return True
+
+    def stop(self):
+        """Stop polling and wait for an in-progress update to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._release_process_lock()
@@ -0,0 +1,54 @@
+"""
+Shared fixtures for the test suite.
+"""
+
+import hashlib
+import numpy as np
+import pytest
+
+
+class FakeSentenceTransformer:
+    """Deterministic stand-in for SentenceTransformer that records its calls."""
+
+    dim = 16
+
+    def __init__(self, model_name: str = "fake", device: str = "cpu", **kwargs):
+        self.model_name = model_name
+        self.max_seq_length = 512
+        self.encoded_texts = []
+        self.encode_calls = 0
+        self.batch_sizes = []
+
+    def tokenizer(self, texts, truncation=True, max_length=None, **kwargs):
+        ids = [text.split()[:max_length] for text in texts]
+        return {"input_ids": ids}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vec / np.linalg.norm(vec)
+
+    def encode(self, sentences, **kwargs):
+        self.encode_calls += 1
+        if isinstance(sentences, str):
+            self.encoded_texts.append(sentences)
+            return self._vector(sentences)
+        self.encoded_texts.extend(sentences)
+        self.batch_sizes.append(len(sentences))
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._vector(text) for text in sentences])
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    """Replace the sentence-transformers model with a fast deterministic fake."""
+    monkeypatch.setattr(
+        "src.embeddings.EmbeddingModel._load_model",
+        lambda self: FakeSentenceTransformer(self.model_name)
+    )
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    return FakeSentenceTransformer
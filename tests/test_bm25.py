@@ -0,0 +1,54 @@
+"""
+Tests for lexical retrieval and rank fusion.
+"""
+
+from src.bm25 import BM25Index, tokenize, reciprocal_rank_fusion
+
+
+def test_tokenize_keeps_exact_policy_tokens():
+    """Test that compound tokens survive tokenization along with their parts."""
+    terms = tokenize("Hotels up to $200/night, see POL-003 and the 401k plan via VPN.")
+
+    for term in ["$200/night", "200", "night", "pol-003", "401k", "vpn"]:
+        assert term in terms
+    assert "the" not in terms
+
+
+def test_bm25_ranks_exact_matches_and_updates(tmp_path):
+    """Test BM25 ranking, incremental removal and persistence."""
+    index = BM25Index()
+    index.add(
+        ["pto", "expense", "security"],
+        [
+            "Employees accrue paid time off every pay period.",
+            "Hotel stays are reimbursed up to $200/night under POL-003.",
+            "Always connect through the VPN when working remotely.",
+        ]
+    )
+
+    assert index.search("What is the $200/night hotel limit?", k=1)[0][0] == "expense"
+    assert index.search("VPN", k=3) == index.search("vpn", k=3)
+
+    index.remove(["security"])
+    assert index.search("VPN") == []
+    assert "vpn" not in index.postings
+
+    path = str(tmp_path / "bm25.json")
+    index.save(path)
+    reloaded = BM25Index.load(path)
+    assert len(reloaded) == 2
+    assert reloaded.search("POL-003") == index.search("POL-003")
+
+    # Replacing a document after a reload only drops its own terms
+    reloaded.add(["expense"], ["Meals are reimbursed up to $75/day."])
+    assert reloaded.search("hotel") == []
+    assert reloaded.search("meals")[0][0] == "expense"
+    assert set(reloaded.postings) == {term for terms in reloaded.doc_terms.values() for term in terms}
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Test that ids ranked well by both retrievers come first."""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused][:2] == ["b", "a"]
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
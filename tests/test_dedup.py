@@ -0,0 +1,53 @@
+"""
+Tests for near-duplicate chunk elimination.
+"""
+
+from pathlib import Path
+from src.dedup import Deduplicator
+from src.document_processor import Document
+
+
+def make_chunk(file_path, text):
+    source = Path(file_path).name
+    return Document(content=text, metadata={"source": source, "doc_id": source.upper(), "file_path": file_path})
+
+
+CONTACT = ("For questions about this policy contact the People Operations team at "
+           "hr@techcorp.example or extension 4400 between nine and five on business days.")
+
+
+def test_near_duplicates_are_dropped_within_each_file():
+    """Test that near-duplicates collapse into the first chunk of their file only."""
+    chunks = [
+        make_chunk("pto.md", CONTACT),
+        make_chunk("pto.md", "Employees accrue fifteen days of paid time off per year, prorated monthly."),
+        make_chunk("pto.md", CONTACT + " Thanks."),
+        make_chunk("remote.md", CONTACT.replace("four", "4")),
+        make_chunk("remote.md", "Remote employees must use the company VPN on public networks."),
+        make_chunk("us/benefits.md", CONTACT + " US office."),
+        make_chunk("uk/benefits.md", CONTACT + " UK office."),
+    ]
+    result = Deduplicator(threshold=0.8).deduplicate(chunks)
+
+    # Copies in other files survive, even same-named ones in other folders, so
+    # re-indexing one file alone can never remove their text
+    assert [doc.content for doc in result.documents] == [
+        chunks[i].content for i in (0, 1, 3, 4, 5, 6)
+    ]
+    assert result.removed == 1
+
+
+def test_streamed_dedup_and_disabled():
+    """Test that streamed deduplication matches the batch result and threshold 0 keeps everything."""
+    chunks = [make_chunk("a.md", CONTACT), make_chunk("b.md", CONTACT), make_chunk("b.md", CONTACT + " Thanks."),
+              make_chunk("us/c.md", CONTACT), make_chunk("uk/c.md", CONTACT)]
+    deduplicator = Deduplicator(threshold=0.8)
+
+    streamed = list(deduplicator.iter_deduplicate(iter(chunks)))
+    assert [doc.metadata["file_path"] for doc in streamed] == ["a.md", "b.md", "us/c.md", "uk/c.md"]
+    assert [doc.id for doc in streamed] == [doc.id for doc in deduplicator.deduplicate(chunks).documents]
+
+    disabled = Deduplicator(threshold=0)
+    assert not disabled.enabled
+    assert len(disabled.deduplicate(chunks).documents) == 5
+    assert len(list(disabled.iter_deduplicate(chunks))) == 5
@@ -0,0 +1,244 @@
+"""
+Tests for document loading and chunking.
+"""
+
+import os
+import re
+import tracemalloc
+import numpy as np
+from src.document_processor import (
+    Document, DocumentBatch, DocumentProcessor, parse_markdown_sections, truncation_report
+)
+
+
+def write_corpus(directory):
+    """Write a small mixed-format policy tree, including one corrupt PDF."""
+    (directory / "nested").mkdir()
+    (directory / "pto_policy.md").write_text(
+        "# PTO Policy\n\n**Document ID**: POL-001\n\n## Accrual\n\n" + "Employees accrue PTO monthly. " * 10
+    )
+    (directory / "notes.txt").write_text("Remote work requires a secure VPN connection. " * 5)
+    for i in range(3):
+        (directory / "nested" / f"page_{i}.html").write_text(
+            f"<html><body><script>ignored()</script><p>Expense page {i}: hotels up to $200/night.</p></body></html>"
+        )
+    (directory / "broken.pdf").write_bytes(b"not a pdf")
+    (directory / "image.png").write_bytes(b"\x89PNG")
+
+
+def test_parallel_loading_is_deterministic_and_collects_errors(tmp_path, monkeypatch):
+    """Test that pooled loading matches serial loading and reports failures instead of raising."""
+    monkeypatch.setattr("src.document_processor.POOL_START_METHOD", "fork")
+    write_corpus(tmp_path)
+
+    serial = DocumentProcessor(max_workers=1)
+    pooled = DocumentProcessor(max_workers=3)
+    serial_docs = serial.load_documents(str(tmp_path))
+    pooled_docs = pooled.load_documents(str(tmp_path))
+
+    assert [doc.id for doc in pooled_docs] == [doc.id for doc in serial_docs]
+    assert [doc.id for doc in pooled.iter_documents(str(tmp_path))] == [doc.id for doc in serial_docs]
+    assert [doc.metadata["source"] for doc in pooled_docs] == [
+        "page_0.html", "page_1.html", "page_2.html", "notes.txt", "pto_policy.md"
+    ]
+    assert "ignored()" not in pooled_docs[0].content
+    assert list(pooled.load_errors) == [str(tmp_path / "broken.pdf")]
+    assert serial.load_errors.keys() == pooled.load_errors.keys()
+
+
+def test_manifest_returns_only_changed_files(tmp_path):
+    """Test that load_changed_documents reports the delta since the last saved manifest."""
+    corpus = tmp_path / "policies"
+    corpus.mkdir()
+    write_corpus(corpus)
+    manifest_path = str(tmp_path / "index" / "ingest_manifest.json")
+    processor = DocumentProcessor(max_workers=1)
+
+    first = processor.load_changed_documents(str(corpus), manifest_path)
+    assert len(first.added) == 5 and not first.modified and not first.deleted
+    assert "broken.pdf" not in first.manifest["files"]
+
+    # Nothing is recorded until the changes have been applied
+    assert processor.load_changed_documents(str(corpus), manifest_path).added == first.added
+    processor.save_manifest(first, manifest_path)
+
+    (corpus / "notes.txt").write_text("Remote work now requires hardware security keys. " * 5)
+    (corpus / "nested" / "page_1.html").unlink()
+    os.utime(corpus / "pto_policy.md", ns=(0, 0))  # touched, not edited
+
+    second = processor.load_changed_documents(str(corpus), manifest_path)
+    assert second.added == [] and second.modified == ["notes.txt"]
+    assert second.deleted == ["nested/page_1.html"]
+    assert second.sources == {str(corpus / "notes.txt"), str(corpus / "nested" / "page_1.html")}
+    assert [doc.metadata["source"] for doc in second.documents] == ["notes.txt"]
+    assert "pto_policy.md" in second.unchanged
+
+    # Changing chunker settings re-chunks everything
+    resized = DocumentProcessor(chunk_size=200, max_workers=1).load_changed_documents(str(corpus), manifest_path)
+    assert len(resized.modified) == 4
+
+
+def test_markdown_sections_cover_all_heading_levels():
+    """Test the single-pass section parser: nesting, offsets and fenced code blocks."""
+    content = (
+        "Intro text\n"
+        "# Benefits\n"
+        "## Health\n"
+        "### Dental\n"
+        "Cleanings are covered.\n"
+        "```\n"
+        "# not a heading\n"
+        "```\n"
+        "## Retirement ##\n"
+        "401k match.\n"
+    )
+    sections = parse_markdown_sections(content)
+
+    assert [s.heading for s in sections] == ["", "Benefits", "Health", "Dental", "Retirement"]
+    assert sections[3].heading_path == ["Benefits", "Health", "Dental"]
+    assert sections[4].heading_path == ["Benefits", "Retirement"]
+    assert "# not a heading" in content[sections[3].start:sections[3].end]
+    assert "".join(content[s.start:s.end] for s in sections) == content
+
+
+def test_markdown_chunks_record_heading_path(tmp_path):
+    """Test that short sections merge forward and chunks carry their heading path."""
+    (tmp_path / "benefits.md").write_text(
+        "# Benefits\n\n**Document ID**: POL-008\n\n## Health\n\n### Dental\n\n"
+        + "Two cleanings per year are covered at no cost. " * 4
+        + "\n\n### Vision\n\n" + "Annual eye exams and a frame allowance are included. " * 4
+    )
+    docs = DocumentProcessor(max_workers=1).load_documents(str(tmp_path))
+
+    assert [doc.metadata["heading_path"] for doc in docs] == [
+        "Benefits > Health > Dental", "Benefits > Health > Vision"
+    ]
+    assert docs[0].content.startswith("# Benefits") and docs[0].metadata["doc_id"] == "POL-008"
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids)
+    )
+
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(data)
+
+
+def test_pdf_chunks_record_page_ranges(tmp_path, monkeypatch):
+    """Test page-wise PDF chunking, including parallel page extraction for large files."""
+    monkeypatch.setattr("src.document_processor.POOL_START_METHOD", "fork")
+    pages = [f"Page {i} covers travel expense rule number {i} for all employees." for i in range(1, 13)]
+    write_pdf(tmp_path / "handbook.pdf", pages)
+
+    serial = DocumentProcessor(chunk_size=200, chunk_overlap=40, max_workers=1).load_documents(str(tmp_path))
+    monkeypatch.setenv("PDF_PARALLEL_PAGES", "4")
+    parallel = DocumentProcessor(chunk_size=200, chunk_overlap=40, max_workers=3).load_documents(str(tmp_path))
+
+    assert [doc.content for doc in parallel] == [doc.content for doc in serial]
+    assert serial[0].metadata["page_start"] == 1
+    assert serial[-1].metadata["page_end"] == 12
+    for doc in serial:
+        assert doc.metadata["page_start"] <= doc.metadata["page_end"]
+        assert f"Page {doc.metadata['page_end']} covers" in doc.content
+    # Chunks overlap across page boundaries
+    assert any(doc.metadata["page_start"] < doc.metadata["page_end"] for doc in serial[1:])
+
+
+class FakeTokenizer:
+    """Whitespace tokenizer with the EmbeddingTokenizer interface."""
+
+    model_name = "fake-whitespace"
+    max_seq_length = 32
+    special_tokens = 2
+
+    def token_offsets(self, texts):
+        return [[match.span() for match in re.finditer(r"\S+", text)] for text in texts]
+
+    def count(self, texts):
+        return np.array([len(offsets) for offsets in self.token_offsets(texts)])
+
+
+def test_token_chunks_fit_the_model_window(tmp_path):
+    """Test that token chunks stay within max_seq_length and overlap by whole tokens."""
+    words = [f"w{i}" for i in range(200)]
+    (tmp_path / "handbook.txt").write_text(
+        " ".join(words[:20]) + "\n\n" + " ".join(words[20:150]) + "\n\n" + " ".join(words[150:])
+    )
+    tokenizer = FakeTokenizer()
+    processor = DocumentProcessor(max_workers=1, tokenizer=tokenizer, chunk_overlap_tokens=5)
+    assert processor.chunk_tokens == 30
+
+    chunks = processor.load_documents(str(tmp_path))
+    tokens = [chunk.content.split() for chunk in chunks]
+    assert all(len(t) <= 30 for t in tokens)
+    for previous, current in zip(tokens, tokens[1:]):
+        assert current[:5] == previous[-5:]
+
+    # Every word is kept, in order
+    covered = [word for t in tokens for word in t]
+    assert sorted(set(covered), key=words.index) == words
+
+    assert truncation_report(chunks, tokenizer)["truncated"] == 0
+    char_chunks = DocumentProcessor(chunk_size=400, chunk_overlap=50, max_workers=1).load_documents(str(tmp_path))
+    report = truncation_report(char_chunks, tokenizer)
+    assert report["truncated"] > 0 and report["dropped_tokens"] > 0
+    assert processor._chunker_settings()["chunk_tokens"] == 30
+
+
+def test_document_batch_round_trips_and_is_compact():
+    """Test that a DocumentBatch returns the same chunks as Documents in less memory."""
+    def chunks():
+        for i in range(2000):
+            metadata = {"source": "handbook.md", "doc_id": "POL-001", "heading": f"Section {i // 50}"}
+            yield Document(content=f"Clause {i}: employees must follow the policy. ü", metadata=metadata)
+
+    documents = list(chunks())
+    assert not hasattr(documents[0], "__dict__")
+    assert documents[0]._id is None and len(documents[0].id) == 32
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    as_list = list(chunks())
+    list_bytes = tracemalloc.get_traced_memory()[0] - before
+    before = tracemalloc.get_traced_memory()[0]
+    batch = DocumentBatch(chunks())
+    batch_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert batch_bytes * 3 < list_bytes
+
+    assert len(batch) == len(as_list)
+    assert [doc.id for doc in batch] == [doc.id for doc in documents]
+    assert batch[-1].content == documents[-1].content and batch[-1].metadata == documents[-1].metadata
+    assert [doc.content for doc in batch[10:12]] == list(batch.texts())[10:12]
+
+    # Materialized documents own their metadata
+    batch[0].metadata["heading"] = "changed"
+    assert batch[0].metadata["heading"] == "Section 0"
+
+    # Ids computed before batching are carried through instead of re-hashed
+    with_ids = DocumentBatch(documents)
+    assert [doc._id for doc in with_ids] == [doc.id for doc in documents]
+    assert batch[0]._id is None
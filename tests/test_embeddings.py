@@ -0,0 +1,182 @@
+"""
+Tests for embedding generation and caching.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pytest
+from src.embeddings import EmbeddingModel, EmbeddingCache, QueryEmbeddingCache
+
+
+def test_document_cache_skips_cached_texts(fake_model):
+    """Test that only cache misses are sent to the model."""
+    embedder = EmbeddingModel()
+    first = embedder.embed_documents(["PTO accrual", "Remote work"])
+
+    embedder = EmbeddingModel()
+    second = embedder.embed_documents(["PTO accrual", "Remote work", "Expenses"])
+
+    assert second[:2] == first
+    assert embedder.model.encoded_texts == ["Expenses"]
+
+
+def test_document_cache_evicts_least_recently_used(tmp_path):
+    """Test that the on-disk cache stays within its size bound."""
+    cache = EmbeddingCache(str(tmp_path), "fake", max_entries=2)
+    cache.put_many(["a"], [[1.0, 0.0]])
+    cache.put_many(["b"], [[0.0, 1.0]])
+    cache.get_many(["a"])
+    cache.put_many(["c"], [[1.0, 1.0]])
+
+    assert len(cache) == 2
+    assert set(cache.get_many(["a", "b", "c"])) == {0, 2}
+
+
+def test_query_cache_serves_repeated_queries(fake_model):
+    """Test that normalized repeated queries skip the model."""
+    embedder = EmbeddingModel()
+    first = embedder.embed_query("How much PTO do I get?")
+    second = embedder.embed_query("  How much PTO   do I get? ")
+
+    assert first == second
+    assert embedder.model.encode_calls == 1
+    stats = embedder.get_cache_stats()["query_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_query_cache_ignores_case_only_for_uncased_tokenizers(fake_model, monkeypatch):
+    """Test that queries differing in case share an entry only when the tokenizer lowercases."""
+    # The fake tokenizer is cased: "NDA" and "nda" embed differently
+    cased = EmbeddingModel()
+    cased.embed_query("Who signs the NDA?")
+    cased.embed_query("who signs the nda?")
+    assert cased.model.encode_calls == 2
+
+    class UncasedModel(fake_model):
+        def tokenizer(self, texts, **kwargs):
+            return super().tokenizer([text.lower() for text in texts], **kwargs)
+
+    monkeypatch.setattr("src.embeddings.EmbeddingModel._load_model", lambda self: UncasedModel(self.model_name))
+    uncased = EmbeddingModel()
+    uncased.embed_query("Who signs the NDA?")
+    uncased.embed_query("who signs the nda?")
+    assert uncased.model.encode_calls == 1
+
+
+def test_query_cache_expires_entries():
+    """Test LRU eviction and TTL expiry of the query cache."""
+    cache = QueryEmbeddingCache(max_size=1, ttl_seconds=60)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") is None
+    assert cache.get("b") == [2.0]
+
+    expired = QueryEmbeddingCache(max_size=10, ttl_seconds=1e-9)
+    expired.put("a", [1.0])
+    assert expired.get("a") is None
+
+
+def test_onnx_backend_matches_torch_backend(tmp_path):
+    """Test cosine agreement between the ONNX and torch backends."""
+    pytest.importorskip("onnxruntime")
+    texts = [
+        "How much PTO do I get?",
+        "Remote work requires manager approval and a secure VPN connection.",
+        "Hotel stays are reimbursed up to $200/night."
+    ]
+    torch_model = EmbeddingModel(backend="torch", cache_dir="", query_cache_size=0)
+    onnx_model = EmbeddingModel(backend="onnx", cache_dir="", query_cache_size=0)
+
+    torch_emb = np.array(torch_model.embed_documents(texts))
+    onnx_emb = np.array(onnx_model.embed_documents(texts))
+    cosine = (torch_emb * onnx_emb).sum(axis=1) / (
+        np.linalg.norm(torch_emb, axis=1) * np.linalg.norm(onnx_emb, axis=1)
+    )
+
+    assert onnx_model.embedding_dim == torch_model.embedding_dim
+    assert cosine.min() > 0.98
+
+
+def test_query_batcher_groups_concurrent_queries(fake_model):
+    """Test that concurrent queries are encoded in one model call."""
+    embedder = EmbeddingModel(query_cache_size=0, batch_wait_ms=200, max_query_batch=4)
+    queries = [f"question {i}" for i in range(4)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(embedder.embed_query, queries))
+
+    expected = EmbeddingModel(query_cache_size=0).embed_documents(queries)
+    assert np.allclose(results, expected)
+    stats = embedder.query_batcher.get_stats()
+    assert stats["queries"] == 4
+    assert stats["batches"] < 4
+
+
+def test_array_api_returns_contiguous_float32(fake_model):
+    """Test that the array APIs skip the list round trip and match the list APIs."""
+    embedder = EmbeddingModel()
+    texts = ["PTO accrual", "Remote work", "PTO accrual"]
+
+    embeddings = embedder.embed_documents_array(texts)
+    query_embedding = embedder.embed_query_array("PTO accrual")
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.flags["C_CONTIGUOUS"]
+    assert embeddings.shape == (3, embedder.embedding_dim)
+    assert np.allclose(embeddings, embedder.embed_documents(texts))
+    assert np.allclose(query_embedding, embeddings[0])
+    assert not query_embedding.flags.writeable
+
+
+def test_document_batches_follow_token_budget(fake_model):
+    """Test length-bucketed batching stays in budget and keeps input order."""
+    embedder = EmbeddingModel(token_budget=8, cache_dir="")
+    texts = ["one", "a b c d e f g h", "two words", "x y z w", "three"]
+
+    embeddings = embedder.embed_documents_array(texts)
+
+    reference = EmbeddingModel(cache_dir="")
+    for text, embedding in zip(texts, embeddings):
+        assert np.allclose(embedding, reference.embed_query_array(text))
+    # The 8-token text is encoded alone; the short ones share batches
+    assert embedder.model.batch_sizes[0] == 1
+    assert sum(embedder.model.batch_sizes) == len(texts)
+    assert len(embedder.model.batch_sizes) < len(texts)
+
+
+def test_process_pool_preserves_order(fake_model, monkeypatch):
+    """Test that sharded multi-process embedding matches in-process results."""
+    monkeypatch.setattr("src.embeddings.POOL_START_METHOD", "fork")
+    texts = [f"policy chunk number {i}" for i in range(40)]
+
+    pooled = EmbeddingModel(cache_dir="", num_workers=2, max_batch_size=4)
+    embeddings = pooled.embed_documents_array(texts)
+
+    reference = EmbeddingModel(cache_dir="", num_workers=1)
+    assert np.allclose(embeddings, reference.embed_documents_array(texts))
+    # All encoding happened in the workers
+    assert pooled.model.encode_calls == 0
+
+    # Later batches reuse the same workers
+    pool = pooled._pool
+    pooled.embed_documents_array([f"another chunk {i}" for i in range(40)])
+    assert pooled._pool is pool
+    pooled.close()
+    assert pooled._pool is None
+
+
+def _failing_worker_init(config):
+    raise ImportError("No module named 'torch'")
+
+
+def test_process_pool_worker_failure_raises(fake_model, monkeypatch):
+    """Test that a worker that cannot load the model fails the call instead of hanging."""
+    monkeypatch.setattr("src.embeddings.POOL_START_METHOD", "fork")
+    monkeypatch.setattr("src.embeddings._init_embedding_worker", _failing_worker_init)
+    pooled = EmbeddingModel(cache_dir="", num_workers=2, max_batch_size=4)
+
+    with pytest.raises(BrokenProcessPool):
+        pooled.embed_documents_array([f"policy chunk number {i}" for i in range(40)])
+    assert pooled._pool is None
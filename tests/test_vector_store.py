@@ -0,0 +1,412 @@
+"""
+Tests for the vector store.
+"""
+
+import numpy as np
+import pytest
+from src.bm25 import MappedBM25Index
+from src.document_processor import Document
+from src.projection import EmbeddingProjection, projection_recall_report
+from src.vector_store import VectorStore
+from src.vector_backends import ChromaBackend, NumpyBackend, PQBackend, normalize_filter
+from src.hnsw_benchmark import benchmark_hnsw, synthetic_corpus
+
+
+def make_documents():
+    """Create a few small policy chunks."""
+    return [
+        Document(
+            content=text,
+            metadata={"source": source, "doc_id": doc_id, "heading": heading, "file_path": source}
+        )
+        for text, source, doc_id, heading in [
+            ("Employees accrue 15 days of PTO per year.", "pto_policy.md", "POL-001", "Accrual"),
+            ("Remote work requires a secure VPN connection.", "remote_work_policy.md", "POL-002", "Security"),
+            ("Hotel stays are reimbursed up to $200/night.", "expense_reimbursement.md", "POL-003", "Travel"),
+        ]
+    ]
+
+
+@pytest.fixture(params=["chroma", "numpy", "pq"])
+def store(request, fake_model, tmp_path):
+    """Create an empty vector store in a temporary directory for each backend."""
+    return VectorStore(persist_directory=str(tmp_path / "index"), backend=request.param)
+
+
+def test_add_and_search(store):
+    """Test that indexed chunks can be found again."""
+    documents = make_documents()
+    store.add_documents(documents)
+
+    results = store.search(documents[1].content, k=2)
+
+    assert store.get_stats()["total_documents"] == 3
+    assert len(results) == 2
+    assert results[0][0].metadata["doc_id"] == "POL-002"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+    assert results[0][1] >= results[1][1]
+
+
+def test_numpy_backend_persists_index(fake_model, tmp_path):
+    """Test that the in-memory index is saved and reloaded from disk."""
+    persist_directory = str(tmp_path / "index")
+    documents = make_documents()
+    VectorStore(persist_directory=persist_directory, backend="numpy").add_documents(documents)
+
+    reopened = VectorStore(persist_directory=persist_directory, backend="numpy")
+    results = reopened.search(documents[0].content, k=5)
+
+    assert reopened.get_stats()["total_documents"] == 3
+    assert [doc.metadata["doc_id"] for doc, _ in results][0] == "POL-001"
+    assert len(results) == 3
+
+
+@pytest.mark.parametrize("backend_class", [NumpyBackend, PQBackend])
+def test_repeated_ids_in_a_batch_are_rejected(tmp_path, backend_class):
+    """Test that a batch repeating an id is rejected before anything is written."""
+    backend = backend_class(str(tmp_path / "index"), "policies")
+    embeddings = np.eye(3, dtype=np.float32)
+
+    for write in (backend.add, backend.upsert):
+        with pytest.raises(ValueError, match="repeat"):
+            write(["a", "a", "b"], embeddings, ["x", "y", "z"], [{}, {}, {}])
+    assert backend.count() == 0
+
+    backend.add(["a", "b"], embeddings[:2], ["x", "z"], [{}, {}])
+    backend.delete(["a"])
+    assert backend.ids == ["b"]
+    assert [hit[0] for hit in backend.query(embeddings[0], k=5)[0]] == ["b"]
+
+
+def test_projected_storage_is_used_for_search(fake_model, tmp_path):
+    """Test that a PCA/float16 projection is persisted and applied to queries."""
+    persist_directory = str(tmp_path / "chroma_db")
+    store = VectorStore(
+        persist_directory=persist_directory,
+        projection=EmbeddingProjection("pca", dim=2, dtype="float16")
+    )
+    documents = make_documents()
+    store.add_documents(documents)
+
+    reopened = VectorStore(persist_directory=persist_directory)
+    results = reopened.search(documents[2].content, k=1)
+
+    assert reopened.get_stats()["embedding_dimension"] == 2
+    assert reopened.projection.dtype == "float16"
+    assert results[0][0].metadata["doc_id"] == "POL-003"
+
+
+def test_projection_recall_report():
+    """Test recall reporting for truncation and PCA projections."""
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((50, 16)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+
+    report = projection_recall_report(
+        corpus,
+        corpus[:10],
+        [EmbeddingProjection("none", dtype="float16"), EmbeddingProjection("truncate", 4)],
+        k=5
+    )
+
+    assert report[0]["recall_at_k"] == pytest.approx(1.0)
+    assert report[0]["compression_ratio"] == pytest.approx(2.0)
+    assert report[1]["dimension"] == 4
+    assert report[1]["recall_at_k"] < 1.0
+
+
+def test_projection_recall_report_on_small_corpus():
+    """Test that PCA dimensions beyond the corpus size are reported as n/a instead of failing."""
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((12, 32)).astype(np.float32)
+
+    report = projection_recall_report(
+        corpus,
+        corpus[:3],
+        [EmbeddingProjection("pca", 8), EmbeddingProjection("pca", 16), EmbeddingProjection("truncate", 16)],
+        k=3
+    )
+
+    assert report[0]["dimension"] == 8 and report[0]["recall_at_k"] > 0
+    assert report[1]["recall_at_k"] is None
+    assert report[2]["recall_at_k"] is not None
+
+
+def test_search_many_matches_single_search(store):
+    """Test that batched search returns the same results as looping over search."""
+    documents = make_documents()
+    store.add_documents(documents)
+    queries = [doc.content for doc in documents]
+
+    batch_results = store.search_many(queries, k=2)
+
+    assert len(batch_results) == 3
+    for query, results in zip(queries, batch_results):
+        single = store.search(query, k=2)
+        assert [doc.content for doc, _ in results] == [doc.content for doc, _ in single]
+        assert [score for _, score in results] == pytest.approx([score for _, score in single], abs=1e-5)
+
+
+def test_sync_only_writes_changes(store):
+    """Test that sync embeds new/changed chunks and prunes stale ones per source."""
+    documents = make_documents()
+    prefix = "Paid time off accrues each pay period for all full-time employees of TechCorp, " * 2
+    long_chunk = Document(content=prefix + "Up to 5 days carry over.", metadata=dict(documents[0].metadata))
+    assert store.sync_documents(documents + [long_chunk])["added"] == 4
+
+    # Same id (first 100 characters unchanged) but new content
+    edited = Document(content=prefix + "Up to 10 days carry over.", metadata=dict(documents[0].metadata))
+    extra = Document(content="PTO requests need two weeks notice.", metadata=dict(documents[0].metadata))
+    store.embedder.model.encoded_texts.clear()
+    metadata_lookups = []
+    original_get_metadata = store.backend.get_metadata
+    store.backend.get_metadata = lambda ids=None: (metadata_lookups.append(ids), original_get_metadata(ids))[1]
+
+    changes = store.sync_documents([documents[0], edited, extra], sources=["remote_work_policy.md"])
+
+    assert edited.id == long_chunk.id
+    assert changes == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+    # Only chunks of the synced sources are read back, never the whole corpus
+    assert metadata_lookups and None not in metadata_lookups
+    assert documents[2].id not in metadata_lookups[0]
+    assert sorted(store.embedder.model.encoded_texts) == sorted([edited.content, extra.content])
+    assert store.get_stats()["total_documents"] == 4
+    assert store.search(edited.content, k=1)[0][0].content == edited.content
+    assert store.sync_documents([documents[0], edited, extra])["unchanged"] == 3
+
+
+def test_sync_keeps_same_named_files_apart(store):
+    """Test that syncing one file never removes the chunks of a same-named file in another folder."""
+    def benefits(region, text):
+        path = f"policies/{region}/benefits.md"
+        return Document(content=text, metadata={"source": "benefits.md", "doc_id": "BENEFITS", "file_path": path})
+
+    us = benefits("us", "US employees get 401(k) matching.")
+    uk = benefits("uk", "UK employees get a workplace pension.")
+    store.sync_documents([us, uk])
+
+    edited = benefits("us", "US employees get 401(k) matching up to 5%.")
+    changes = store.sync_documents([edited], sources=["policies/us/benefits.md"])
+
+    assert changes == {"added": 1, "updated": 0, "removed": 1, "unchanged": 0}
+    assert set(store.backend.get_metadata()) == {edited.id, uk.id}
+    assert store.sync_documents([], sources=["policies/us/benefits.md"])["removed"] == 1
+    assert set(store.backend.get_metadata()) == {uk.id}
+
+
+def test_hybrid_retrieval_surfaces_exact_tokens(store, monkeypatch):
+    """Test that hybrid retrieval fuses BM25 hits into the results with dense scores."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    from src.rag_pipeline import RAGPipeline
+
+    store.add_documents(make_documents())
+    query = "What is the $200/night limit?"
+    rag = RAGPipeline(vector_store=store, top_k=2, candidate_k=1)
+
+    results = rag.retrieve(query)
+
+    assert [doc.metadata["doc_id"] for doc, _ in store.keyword_search(query, k=3)] == ["POL-003"]
+    assert "POL-003" in [doc.metadata["doc_id"] for doc, _ in results]
+    similarities = store.similarities(query, [doc.id for doc, _ in results])
+    for doc, score in results:
+        assert score == pytest.approx(similarities[doc.id], abs=1e-4)
+
+
+def test_filtered_search_only_returns_matching_chunks(store):
+    """Test that metadata filters are applied inside the index query."""
+    documents = make_documents()
+    store.add_documents(documents)
+    query = documents[0].content
+
+    scoped = store.search(query, k=3, where={"doc_id": "POL-002"})
+    excluded = store.search_many([query], k=3, where={"source": {"$nin": ["pto_policy.md"]}})[0]
+    either = store.search(query, k=3, where={"$or": [{"doc_id": "POL-001"}, {"heading": "Travel"}]})
+
+    assert [doc.metadata["doc_id"] for doc, _ in scoped] == ["POL-002"]
+    assert {doc.metadata["doc_id"] for doc, _ in excluded} == {"POL-002", "POL-003"}
+    assert [doc.metadata["doc_id"] for doc, _ in either][0] == "POL-001"
+    assert {doc.metadata["doc_id"] for doc, _ in either} == {"POL-001", "POL-003"}
+    assert store.keyword_search("$200/night", k=3, where={"doc_id": "POL-001"}) == []
+    single = store.search(query, k=3, where={"$and": [{"doc_id": "POL-002"}]})
+    assert [doc.metadata["doc_id"] for doc, _ in single] == ["POL-002"]
+    missing = store.search(query, k=3, where={"doc_id": {"$ne": "POL-404"}})
+    assert len(missing) == 3
+
+    if isinstance(store.backend, NumpyBackend):
+        # One integer code per row and field, not one mask per distinct value
+        column, codes = store.backend._columns["doc_id"]
+        assert column.dtype == np.int32 and column.shape == (3,)
+        assert set(codes) == {"POL-001", "POL-002", "POL-003"}
+
+
+def test_invalid_filters_are_rejected():
+    """Test filter validation and canonicalization."""
+    assert normalize_filter({"doc_id": "POL-001", "heading": "Travel"}) == {
+        "$and": [{"doc_id": {"$eq": "POL-001"}}, {"heading": {"$eq": "Travel"}}]
+    }
+    # Chroma needs at least two clauses in $and/$or
+    assert normalize_filter({"$or": [{"doc_id": "POL-001"}]}) == {"doc_id": {"$eq": "POL-001"}}
+    for bad in [
+        {"doc_id": {"$regex": "POL"}}, {"$not": {}}, {"source": {"$in": "pto"}}, ["doc_id"],
+        {"doc_id": ["POL-001"]}, {"doc_id": {"$ne": {"a": 1}}}, {"source": {"$in": [["pto"]]}},
+        {"$and": [{}]}
+    ]:
+        with pytest.raises(ValueError):
+            normalize_filter(bad)
+
+
+def test_snapshot_serves_same_results(store, tmp_path):
+    """Test that a memory-mapped snapshot answers like the index it was written from."""
+    documents = make_documents()
+    store.add_documents(documents)
+    snapshot_path = str(tmp_path / "snapshot")
+    store.write_snapshot(snapshot_path)
+
+    snapshot = VectorStore(persist_directory=snapshot_path, backend="snapshot")
+    query = "VPN for remote work"
+
+    assert snapshot.get_stats()["total_documents"] == 3
+    assert [doc.content for doc, _ in snapshot.search(query, k=3)] == \
+        [doc.content for doc, _ in store.search(query, k=3)]
+    assert [doc.content for doc, _ in snapshot.keyword_search("$200/night")] == [documents[2].content]
+    filtered = snapshot.search(query, k=3, where={"doc_id": "POL-003"})
+    assert [doc.metadata["doc_id"] for doc, _ in filtered] == ["POL-003"]
+
+    # The lexical index, id lookups and filter columns are mapped, not parsed on first query
+    assert isinstance(snapshot._bm25, MappedBM25Index)
+    for where in ({"doc_id": {"$ne": "POL-003"}}, {"doc_id": {"$nin": ["POL-001", "missing"]}}, {"missing": "x"}):
+        assert snapshot.backend.filter_ids(normalize_filter(where)) == store.backend.filter_ids(normalize_filter(where))
+    for text in ("remote work", "hotel $200/night"):
+        assert [(doc.id, round(score, 6)) for doc, score in snapshot.keyword_search(text, where={"doc_id": {"$ne": "POL-002"}})] == \
+            [(doc.id, round(score, 6)) for doc, score in store.keyword_search(text, where={"doc_id": {"$ne": "POL-002"}})]
+    ids = [doc.id for doc in documents]
+    assert set(snapshot.backend.get_documents(ids[::-1] + ["missing"])) == set(ids)
+
+    with pytest.raises(RuntimeError):
+        snapshot.add_documents(documents)
+
+
+def test_hnsw_parameters_and_benchmark(tmp_path, monkeypatch):
+    """Test that HNSW settings reach the collection and the benchmark measures recall."""
+    monkeypatch.setenv("CHROMA_HNSW_SEARCH_EF", "64")
+    backend = ChromaBackend(str(tmp_path / "index"), "policies")
+    assert backend.get_stats()["hnsw"] == {"search_ef": 64}
+
+    corpus, queries = synthetic_corpus(500, dim=16, n_queries=20, n_clusters=8)
+    results = benchmark_hnsw(corpus, queries, k=5, grid=[{"M": 16, "construction_ef": 100, "search_ef": 100}])
+
+    assert len(results) == 1
+    assert results[0]["recall_at_k"] > 0.9
+    assert results[0]["p99_ms"] >= results[0]["p50_ms"]
+
+
+def test_pq_backend_compresses_with_high_recall(tmp_path):
+    """Test that the PQ index is much smaller than float32 and re-ranks to near-exact results."""
+    corpus, queries = synthetic_corpus(10000, dim=64, n_queries=30, n_clusters=16)
+    ids = [str(i) for i in range(len(corpus))]
+    documents = [""] * len(corpus)
+    metadatas = [{"shard": i % 2} for i in range(len(corpus))]
+
+    exact = NumpyBackend(str(tmp_path / "exact"), "policies")
+    exact.add(ids, corpus, documents, metadatas)
+    pq = PQBackend(str(tmp_path / "pq"), "policies", subvectors=8, rerank=200)
+    pq.add(ids, corpus, documents, metadatas)
+
+    recalls = [
+        len({hit[0] for hit in approx} & {hit[0] for hit in truth}) / 5
+        for approx, truth in zip(pq.query(queries, 5), exact.query(queries, 5))
+    ]
+    stats = pq.get_stats()
+
+    assert np.mean(recalls) >= 0.9
+    assert stats["bytes_per_vector"] == 8
+    assert stats["compression_ratio"] > 10
+    assert all(hit[2]["shard"] == 1 for hit in pq.query(queries[:3], 5, where={"shard": {"$eq": 1}})[0])
+
+    reopened = PQBackend(str(tmp_path / "pq"), "policies", rerank=200)
+    assert [hit[0] for hit in reopened.query(queries[:1], 5)[0]] == [hit[0] for hit in pq.query(queries[:1], 5)[0]]
+
+
+def test_add_documents_stream_batches_with_backpressure(store):
+    """Test that streamed ingestion matches add_documents and never runs far ahead of the writer."""
+    documents = make_documents() + [
+        Document(content=f"Policy clause {i} about badge access.", metadata={"source": "security.md", "doc_id": "POL-009"})
+        for i in range(7)
+    ]
+    produced = []
+    written = []
+    original_add = store.backend.add
+
+    def generate():
+        for doc in documents:
+            # Unwritten chunks: queued batches, the batch being written and the one being filled
+            assert len(produced) - sum(written) <= 2 * (2 + 2)
+            produced.append(doc)
+            yield doc
+
+    def record_add(ids, *args):
+        written.append(len(ids))
+        original_add(ids, *args)
+
+    store.backend.add = record_add
+    count = store.add_documents_stream(generate(), batch_size=2, prefetch=2)
+
+    assert count == len(documents)
+    assert written == [2, 2, 2, 2, 2]
+    assert store.get_stats()["total_documents"] == len(documents)
+    assert store.keyword_search("badge clause 3", k=1)[0][0].content == "Policy clause 3 about badge access."
+
+
+def test_add_documents_stream_propagates_producer_errors(store):
+    """Test that a failing document source surfaces in the caller."""
+    def generate():
+        yield make_documents()[0]
+        raise RuntimeError("parse failed")
+
+    with pytest.raises(RuntimeError, match="parse failed"):
+        store.add_documents_stream(generate(), batch_size=1)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "pq"])
+def test_add_documents_stream_saves_index_once(fake_model, tmp_path, backend):
+    """Test that file-backed indexes are persisted after the last streamed batch only."""
+    persist_directory = str(tmp_path / "index")
+    store = VectorStore(persist_directory=persist_directory, backend=backend)
+    saves = []
+    original_save = store.backend._save
+    store.backend._save = lambda: (saves.append(store.backend.count()), original_save())
+    documents = [
+        Document(content=f"Policy clause {i} about badge access.", metadata={"source": "security.md", "doc_id": "POL-009"})
+        for i in range(9)
+    ]
+
+    store.add_documents_stream(iter(documents), batch_size=2)
+
+    assert saves == [9]
+    reopened = VectorStore(persist_directory=persist_directory, backend=backend)
+    assert reopened.search(documents[4].content, k=1)[0][0].content == documents[4].content
+
+
+def test_pca_projection_is_fitted_on_the_whole_corpus(fake_model, tmp_path):
+    """Test that streamed indexing needs a corpus-wide PCA fit and too few samples fail loudly."""
+    store = VectorStore(
+        persist_directory=str(tmp_path / "index"),
+        backend="numpy",
+        projection=EmbeddingProjection("pca", dim=4)
+    )
+    documents = [
+        Document(content=f"Policy clause {i} about badge access.", metadata={"source": "security.md", "doc_id": "POL-009"})
+        for i in range(12)
+    ]
+
+    with pytest.raises(RuntimeError, match="fit_projection"):
+        store.add_documents_stream(iter(documents), batch_size=2)
+    with pytest.raises(ValueError, match="at least 4"):
+        store.fit_projection(iter(documents), sample_size=3)
+
+    store.fit_projection(iter(documents), sample_size=8)
+    store.add_documents_stream(iter(documents), batch_size=2)
+
+    assert store.projection.components.shape[0] == 4
+    assert store.search(documents[5].content, k=1)[0][0].content == documents[5].content
@@ -0,0 +1,94 @@
+"""
+Tests for hot reindexing of the policy directory.
+"""
+
+import threading
+import time
+from src.document_processor import DocumentProcessor
+from src.vector_store import VectorStore
+from src.watcher import PolicyWatcher, ReadWriteLock
+
+
+def test_watcher_applies_only_changed_files(fake_model, tmp_path):
+    """Test that settled edits and deletions reach the live index and untouched files are kept."""
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "pto.txt").write_text("Employees accrue 15 days of PTO per year.")
+    (policies / "vpn.txt").write_text("Remote work requires a secure VPN connection.")
+    (policies / "travel.txt").write_text("Hotel stays are reimbursed up to $200/night.")
+
+    manifest_path = str(tmp_path / "index" / "ingest_manifest.json")
+    store = VectorStore(persist_directory=str(tmp_path / "index"), backend="numpy")
+    processor = DocumentProcessor(max_workers=1)
+    changes = processor.load_changed_documents(str(policies), manifest_path, full=True)
+    store.add_documents(changes.documents)
+    processor.save_manifest(changes, manifest_path)
+
+    watcher = PolicyWatcher(
+        store, processor, ReadWriteLock(), str(policies), interval=0, debounce=0, manifest_path=manifest_path
+    )
+    assert not watcher.poll()
+
+    (policies / "pto.txt").write_text("Employees accrue 20 days of PTO per year.")
+    (policies / "travel.txt").unlink()
+    # The first poll sees the burst, the next one applies it once it has settled
+    assert not watcher.poll()
+    assert watcher.poll()
+    assert not watcher.poll()
+
+    contents = {metadata["source"]: content for content, metadata in store.backend.get_documents(
+        list(store.backend.get_metadata())
+    ).values()}
+    assert contents == {
+        "pto.txt": "Employees accrue 20 days of PTO per year.",
+        "vpn.txt": "Remote work requires a secure VPN connection.",
+    }
+    assert store.keyword_search("hotel", k=5) == []
+
+
+def test_read_write_lock_excludes_writers_from_readers():
+    """Test that a writer waits for active readers and blocks new ones."""
+    lock = ReadWriteLock()
+    events = []
+    reader_in = threading.Event()
+
+    def writer():
+        reader_in.wait()
+        with lock.write():
+            events.append("write")
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    with lock.read():
+        reader_in.set()
+        time.sleep(0.05)
+        events.append("read done")
+    thread.join()
+
+    with lock.read():
+        events.append("read after write")
+    assert events == ["read done", "write", "read after write"]
+
+
+def test_watcher_runs_in_a_single_process_only(fake_model, tmp_path, monkeypatch):
+    """Test that a second watcher on the same index, or a multi-worker deployment, does not start."""
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    store = VectorStore(persist_directory=str(tmp_path / "index"), backend="numpy")
+    processor = DocumentProcessor(max_workers=1)
+
+    def make_watcher():
+        return PolicyWatcher(store, processor, ReadWriteLock(), str(policies), interval=60)
+
+    first, second = make_watcher(), make_watcher()
+    assert first.start()
+    try:
+        # Each watcher opens its own lock file handle, as another worker process would
+        assert not second.start()
+    finally:
+        first.stop()
+    assert second.start()
+    second.stop()
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    assert not make_watcher().start()